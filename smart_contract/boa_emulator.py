@@ -0,0 +1,373 @@
+"""
+In-memory stand-in for the parts of neo-boa that the smart contracts use
+
+It lets you run neo_futures.Main (or the oracle_judge contracts) off-chain, without a neo-python node:
+- Storage is a dict-backed context
+- The clock and block height are under your control
+- Notify and Log calls are captured so you can inspect them afterwards
+- CheckWitness passes for everyone unless you restrict it to a set of script hashes
+
+Values behave like NEO VM stack items: storage hands back byte arrays that compare and do arithmetic
+as little-endian integers, and concat/take/substr work on the byte representation of their arguments
+
+Usage:
+    emulator = Emulator()
+    emulator.load('neo_futures.py')
+    emulator.invoke('create_new_game', [b'client', 'NEO_USD'])
+    emulator.advance(480)
+    emulator.notifications
+
+Or run the test cases that neo-python uses against a contract (exits 1 if a case's "expected" result doesn't match):
+    python boa_emulator.py neo_futures.py neo_futures.test.json
+"""
+
+import builtins
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import types
+
+APPLICATION = 0x10
+VERIFICATION = 0x00
+
+starting_timestamp = 1519544672 # T_0 used by neo_futures
+block_time = 15 # seconds between blocks on average
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+ADDRESS_VERSION = 23
+
+# The emulator the boa functions below talk to, set by Emulator.activate
+_active = None
+
+
+def to_bytes(value):
+    """ The byte array the NEO VM would use for a stack item """
+    kind = type(value)
+    if kind is ByteArray or kind is bytes:
+        return value
+    if kind is int:
+        if value == 0:
+            return b''
+        # Two's complement little-endian, as short as it can be while keeping the sign
+        return value.to_bytes((value + (value < 0)).bit_length() // 8 + 1, 'little', signed=True)
+    if kind is str:
+        return value.encode('utf-8')
+    if kind is bool:
+        return b'\x01' if value else b''
+    return bytes(value)
+
+
+def to_int(value):
+    """ The integer the NEO VM would use for a stack item """
+    kind = type(value)
+    if kind is int:
+        return value
+    if kind is ByteArray or kind is bytes:
+        return int.from_bytes(value, 'little', signed=True)
+    return int.from_bytes(to_bytes(value), 'little', signed=True)
+
+
+def address_to_script_hash(address):
+    """ The script hash of a NEO address (base58check, version 23), or None if it isn't one """
+    if len(address) != 34 or address[0] != 'A' or any(c not in BASE58 for c in address):
+        return None
+    n = 0
+    for c in address:
+        n = n * 58 + BASE58.index(c)
+    data = n.to_bytes(25, 'big')
+    checksum = hashlib.sha256(hashlib.sha256(data[:21]).digest()).digest()[:4]
+    if data[0] != ADDRESS_VERSION or data[21:] != checksum:
+        return None
+    return data[1:21]
+
+
+def to_stack_item(value):
+    """ Converts invocation arguments the way neo-python passes them to Main """
+    if isinstance(value, str):
+        # Addresses are passed as their script hash
+        script_hash = address_to_script_hash(value)
+        if script_hash is not None:
+            return ByteArray(script_hash)
+    if isinstance(value, (str, bytes, bytearray)) and not isinstance(value, ByteArray):
+        return ByteArray(to_bytes(value))
+    if isinstance(value, list):
+        return [to_stack_item(v) for v in value]
+    return value
+
+
+class ByteArray(bytes):
+    """ A byte array stack item: equality, ordering and arithmetic treat it as a little-endian integer """
+
+    def __eq__(self, other):
+        # boa compiles == and != to NUMEQUAL/NUMNOTEQUAL, so b'\x01' and b'\x01\x00' are equal
+        if other is None or isinstance(other, (list, dict)):
+            return False
+        return to_int(self) == to_int(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = bytes.__hash__
+
+    def __bool__(self):
+        return any(self)
+
+    def __int__(self):
+        return to_int(self)
+
+    __index__ = __int__
+
+    def __add__(self, other):
+        return to_int(self) + to_int(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return to_int(self) - to_int(other)
+
+    def __rsub__(self, other):
+        return to_int(other) - to_int(self)
+
+    def __mul__(self, other):
+        return to_int(self) * to_int(other)
+
+    __rmul__ = __mul__
+
+    def __floordiv__(self, other):
+        return to_int(self) // to_int(other)
+
+    def __rfloordiv__(self, other):
+        return to_int(other) // to_int(self)
+
+    def __mod__(self, other):
+        return to_int(self) % to_int(other)
+
+    def __rmod__(self, other):
+        return to_int(other) % to_int(self)
+
+    def __lt__(self, other):
+        return to_int(self) < to_int(other)
+
+    def __le__(self, other):
+        return to_int(self) <= to_int(other)
+
+    def __gt__(self, other):
+        return to_int(self) > to_int(other)
+
+    def __ge__(self, other):
+        return to_int(self) >= to_int(other)
+
+
+class Header(object):
+
+    def __init__(self, index, timestamp):
+        self.Index = index
+        self.Timestamp = timestamp
+        self.NextConsensus = b''
+
+
+class Transaction(object):
+    """ Script container with no attached assets, which is how the contracts are invoked here """
+
+    def __init__(self):
+        self.References = []
+        self.Outputs = []
+        self.Inputs = []
+        self.Hash = b''
+
+
+class Emulator(object):
+    """ One blockchain's worth of state for a contract: storage, blocks, events and witnesses """
+
+    def __init__(self, timestamp=starting_timestamp, script_hash=b'\x00' * 20):
+        self.storage = {}
+        self.headers = [Header(0, timestamp)]
+        self.notifications = []
+        self.logs = []
+        self.witnesses = None
+        self.trigger = APPLICATION
+        self.script_hash = script_hash
+        self.script_container = Transaction()
+        self.contract = None
+
+    @property
+    def height(self):
+        return self.get_height()
+
+    @property
+    def timestamp(self):
+        return self.headers[-1].Timestamp
+
+    def advance(self, seconds, blocks=None):
+        """ Moves the clock on by seconds, adding a block roughly every block_time seconds """
+        if blocks is None:
+            blocks = max(1, seconds // block_time)
+        start = self.timestamp
+        for n in range(1, blocks + 1):
+            self.headers.append(Header(len(self.headers), start + seconds * n // blocks))
+
+    def set_timestamp(self, timestamp):
+        """ Adds a single block at exactly the given time """
+        self.headers.append(Header(len(self.headers), timestamp))
+
+    def activate(self):
+        global _active
+        _active = self
+
+    def load(self, path):
+        """ Imports a contract module with the boa modules pointing at this emulator """
+        install()
+        self.activate()
+        name = 'emulated_' + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        self.contract = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.contract)
+        return self.contract
+
+    def invoke(self, operation, args, trigger=APPLICATION):
+        """ Calls Main the way the VM would for an invocation transaction """
+        self.activate()
+        self.trigger = trigger
+        return self.contract.Main(to_stack_item(operation), to_stack_item(args))
+
+    # Storage
+
+    def get_context(self):
+        return self
+
+    def storage_get(self, key):
+        return ByteArray(self.storage.get(bytes(to_bytes(key)), b''))
+
+    def storage_put(self, key, value):
+        self.storage[bytes(to_bytes(key))] = bytes(to_bytes(value))
+
+    def storage_delete(self, key):
+        self.storage.pop(bytes(to_bytes(key)), None)
+
+    # Runtime
+
+    def notify(self, payload):
+        self.notifications.append(payload)
+
+    def log(self, message):
+        self.logs.append(message)
+
+    def check_witness(self, script_hash):
+        return self.witnesses is None or to_bytes(script_hash) in self.witnesses
+
+    # Blockchain
+
+    def get_height(self):
+        return len(self.headers) - 1
+
+    def get_header(self, height):
+        return self.headers[to_int(height)]
+
+    # Builtins
+
+    def concat(self, a, b):
+        return ByteArray(b''.join((to_bytes(a), to_bytes(b))))
+
+    def take(self, source, count):
+        return ByteArray(to_bytes(source)[:to_int(count)])
+
+    def substr(self, source, start, length):
+        start = to_int(start)
+        return ByteArray(to_bytes(source)[start:start + to_int(length)])
+
+
+def _boa_modules():
+    """ Module name -> attributes for every boa import the contracts make """
+    return {
+        'boa.code.builtins': {
+            'concat': lambda a, b: _active.concat(a, b),
+            'take': lambda source, count: _active.take(source, count),
+            'substr': lambda source, start, length: _active.substr(source, start, length),
+            'range': builtins.range,
+            'list': lambda length=0: [None] * to_int(length),
+        },
+        'boa.blockchain.vm.Neo.Storage': {
+            'GetContext': lambda: _active.get_context(),
+            'Get': lambda context, key: context.storage_get(key),
+            'Put': lambda context, key, value: context.storage_put(key, value),
+            'Delete': lambda context, key: context.storage_delete(key),
+        },
+        'boa.blockchain.vm.Neo.Runtime': {
+            'Log': lambda message: _active.log(message),
+            'Notify': lambda payload: _active.notify(payload),
+            'GetTrigger': lambda: _active.trigger,
+            'CheckWitness': lambda script_hash: _active.check_witness(script_hash),
+        },
+        'boa.blockchain.vm.Neo.TriggerType': {
+            'Application': lambda: APPLICATION,
+            'Verification': lambda: VERIFICATION,
+        },
+        'boa.blockchain.vm.Neo.Blockchain': {
+            'GetHeight': lambda: _active.get_height(),
+            'GetHeader': lambda height: _active.get_header(height),
+        },
+        'boa.blockchain.vm.Neo.Header': {
+            'GetTimestamp': lambda header: header.Timestamp,
+            'GetNextConsensus': lambda header: header.NextConsensus,
+        },
+        'boa.blockchain.vm.System.ExecutionEngine': {
+            'GetScriptContainer': lambda: _active.script_container,
+            'GetExecutingScriptHash': lambda: _active.script_hash,
+        },
+        'boa.blockchain.vm.Neo.Transaction': {
+            '__all__': [],
+        },
+        'boa.blockchain.vm.Neo.Output': {
+            'GetScriptHash': lambda output: output.ScriptHash,
+            'GetValue': lambda output: output.Value,
+            'GetAssetId': lambda output: output.AssetId,
+        },
+    }
+
+
+def install():
+    """ Registers the stand-in boa modules, unless they are already in place """
+    if 'boa.code.builtins' in sys.modules and hasattr(sys.modules['boa.code.builtins'], 'concat'):
+        return
+    for name, attributes in _boa_modules().items():
+        parts = name.split('.')
+        for n in range(1, len(parts) + 1):
+            package = '.'.join(parts[:n])
+            if package not in sys.modules:
+                sys.modules[package] = types.ModuleType(package)
+        sys.modules[name].__dict__.update(attributes)
+
+
+def run_test_cases(contract_path, test_path):
+    """ Runs the cases from a neo-python .test.json file in order against a fresh emulator
+    A case can also move the clock on by "advance" seconds before it runs,
+    and give the "expected" result, which is compared as the VM would (as byte arrays)
+    Returns (name, result, passed) for every case, passed is None when nothing was expected
+    """
+    with open(test_path) as f:
+        cases = json.load(f)['cases']
+    emulator = Emulator()
+    emulator.load(contract_path)
+    results = []
+    for case in cases:
+        if 'advance' in case:
+            emulator.advance(case['advance'])
+        operation, args = case['params']
+        result = emulator.invoke(operation, args)
+        passed = None
+        if 'expected' in case:
+            passed = to_bytes(result) == to_bytes(to_stack_item(case['expected']))
+        results.append((case['name'], result, passed))
+    return results
+
+
+if __name__ == '__main__':
+    failed = 0
+    for name, result, passed in run_test_cases(sys.argv[1], sys.argv[2]):
+        if passed is False:
+            failed += 1
+            print("{}: {} FAILED".format(name, result))
+        else:
+            print("{}: {}".format(name, result))
+    sys.exit(1 if failed else 0)
@@ -6,8 +6,10 @@ Note: you do need a tiny amount of gas each time 0.001
 Hence, you need to use the coz faucet somehow
 '''
 
+import binascii
+import math
 import threading
-from time import sleep
+from time import time
 import sys
 from logzero import logger
 from twisted.internet import reactor, task
@@ -20,8 +22,19 @@ from neo.Implementations.Blockchains.LevelDB.LevelDBBlockchain import LevelDBBlo
 from neo.Settings import settings
 from neo.Prompt.Commands.Invoke import InvokeContract, TestInvokeContract, test_invoke
 from neo.Implementations.Wallets.peewee.UserWallet import UserWallet
+from neo.Core.TX.InvocationTransaction import InvocationTransaction
+from neo.Core.TX.TransactionAttribute import TransactionAttribute, TransactionAttributeUsage
+from neo.Core.State.StorageKey import StorageKey
+from neo.VM.ScriptBuilder import ScriptBuilder
+from neo.VM.OpCode import PACK
 import coinmarketcap
+import price_cache
+from feeds import load_feeds
+from fee_estimates import FeeEstimates
+from invocation_pool import InvocationPool
+from price_log import PriceLog
 from neocore.BigInteger import BigInteger
+from neocore.UInt160 import UInt160
 from neo.Core.Helper import Helper
 from neocore.Fixed8 import Fixed8
 
@@ -35,94 +48,260 @@ from neocore.Fixed8 import Fixed8
 
 smart_contract_hash = "d5537fc7dea2150d250e9d5f0cd67b8b248b3fdf"
 smart_contract = SmartContract(smart_contract_hash)
+fee_estimates = FeeEstimates(smart_contract_hash)
 
 
 Wallet = None
 
-buffer = None
+pool = None
 
-#normalisation = 480
+# source -> function that fetches a list of (ticker, convert) pairs concurrently
+# returning (ticker, convert) -> (last_updated, price), or the exception if that fetch failed
+# CMC prices go through the cache shared with the watcher and webapp
+SOURCES = {
+    'coinmarketcap': price_cache.get_prices,
+}
 
-def test_invoke_contract(args):
-    if not Wallet:
-        print("where's the wallet")
-        return
-    if args and len(args) > 0:
-
-        # Wait one block
-        h = Blockchain.Default().Height
-        while (h == Blockchain.Default().Height):
-            sleep(10)
-
-        while(Blockchain.Default().Height - Wallet._current_height > 1):
-            print("sleeping whilst it syncs up")
-            print(Blockchain.Default().Height)
-            print(Wallet._current_height)
-            sleep(5)
-
-        logger.info("here are the args to run")
-        logger.info(args)
-        logger.info(args[1:])
-        tx, fee, results, num_ops= TestInvokeContract(Wallet, args)
-
-        print(
-             "\n-------------------------------------------------------------------------------------------------------------------------------------")
-        print("Test invoke successful")
-        print("Total operations: %s" % num_ops)
-        print("Results %s" % [str(item) for item in results])
-        print("Invoke TX GAS cost: %s" % (tx.Gas.value / Fixed8.D))
-        print("Invoke TX fee: %s" % (fee.value / Fixed8.D))
-        print(
-              "-------------------------------------------------------------------------------------------------------------------------------------\n")
-
-        print("Results %s " % [str(item) for item in results])
-        print(tx.Gas.value / Fixed8.D)
-
-        if tx is not None and results is not None:
-            print("Invoking for real")
-            print(Wallet.ToJson())
-
-            result = InvokeContract(Wallet, tx, fee)
-            return
-    return
-
-
-def custom_background_code():
-    """ Custom code run in a background thread. Prints the current block height.
-    This function is run in a daemonized thread, which means it can be instantly killed at any
-    moment, whenever the main thread quits. If you need more safety, don't use a  daemonized
-    thread and handle exiting this thread in another way (eg. with signals and events).
-    """
-    global buffer
-    while True:
-        logger.info("Block %s / %s", str(Blockchain.Default().Height), str(Blockchain.Default().HeaderHeight))
-        buffer, changed = coinmarketcap.update_buffer(buffer)
-        print(buffer)
+ROUNDING = {
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'round': round,
+}
 
+starting_ts = 1519544672 # T_0 of the smart contract
+timestep = 480 # Width of each T_n window in seconds
+history_depth = 288 # Snapshots kept per feed, a day of CMC's 5 minute updates
+price_log_path = "prices_{}.log" # Per feed price log, replayed on startup
 
-        if changed:
 
-            latest_price = BigInteger(float(buffer[-1][1]) * 1000)
+def window_for(ts):
+    """ The T_n whose window ts falls in """
+    return starting_ts + ((ts - starting_ts) // timestep) * timestep
 
-            live_ts = BigInteger(buffer[-1][0])
-            starting_ts = BigInteger(1519544672)
-            diff = live_ts - starting_ts
-            div = diff // 480
-            ts = starting_ts + (div * 480)
 
+def instance_oracle_count(game_type, ts):
+    """ Oracles registered for an instance so far, read from the contract's storage on our own node
+    Keys follow the neo_futures layout: tag 0x10 + game_type holds the game id, tag 0x12 + game id + index the header
+    """
+    script_hash = UInt160.ParseString(smart_contract_hash)
+    game = Blockchain.Default().GetStorageItem(StorageKey(script_hash=script_hash, key=b'\x10' + bytes(game_type)))
+    if game is None:
+        return 0
+    index = (int(ts) - starting_ts) // timestep
+    key = b'\x12' + bytes(game.Value[:2]) + index.to_bytes(4, 'little')
+    header = Blockchain.Default().GetStorageItem(StorageKey(script_hash=script_hash, key=key))
+    if header is None:
+        return 0
+    return int.from_bytes(bytes(header.Value[:4]), 'little')
+
+
+def push_param(sb, param):
+    # Lists are pushed item by item, last first, then packed into an array
+    if isinstance(param, list):
+        for item in reversed(param):
+            push_param(sb, item)
+        sb.push(len(param))
+        sb.Emit(PACK)
+    else:
+        sb.push(param)
+
+
+def build_invocation(args, gas, fee):
+    """ Builds the transaction TestInvokeContract would have, using an estimated gas instead of running the VM """
+    contract_hash, operation, params = args
+    sb = ScriptBuilder()
+    push_param(sb, params)
+    sb.push(operation.encode('utf-8'))
+    sb.EmitAppCall(UInt160.ParseString(contract_hash).Data)
+    tx = InvocationTransaction()
+    tx.Version = 1
+    tx.outputs = []
+    tx.inputs = []
+    tx.scripts = []
+    # No inputs or outputs, so the oracle's script hash is attached for the witness
+    tx.Attributes = [TransactionAttribute(usage=TransactionAttributeUsage.Script, data=wallet_arr)]
+    tx.Script = binascii.unhexlify(sb.ToArray())
+    tx.Gas = gas
+    return Wallet.MakeTransaction(tx=tx, fee=fee)
+
+
+def test_invoke_contract(args, oracle_count=0, deadline=None):
+    if not Wallet:
+        print("where's the wallet")
+        return
+    if args and len(args) > 0:
+        operation = args[1]
+        params = args[2]
+        estimate = fee_estimates.get(operation, params, oracle_count)
+        if estimate is not None:
+            gas, fee = estimate
+            logger.info("Using the cached GAS estimate for %s, skipping the test invoke", operation)
+            tx = build_invocation(args, gas, fee)
+        else:
+            logger.info("here are the args to run")
+            logger.info(args)
+            logger.info(args[1:])
+            tx, fee, results, num_ops= TestInvokeContract(Wallet, args)
+            if tx is None or results is None:
+                return
+
+            print(
+                 "\n-------------------------------------------------------------------------------------------------------------------------------------")
+            print("Test invoke successful")
+            print("Total operations: %s" % num_ops)
+            print("Results %s" % [str(item) for item in results])
+            print("Invoke TX GAS cost: %s" % (tx.Gas.value / Fixed8.D))
+            print("Invoke TX fee: %s" % (fee.value / Fixed8.D))
+            print(
+                  "-------------------------------------------------------------------------------------------------------------------------------------\n")
+            fee_estimates.put(operation, params, tx.Gas, fee, oracle_count)
+
+        if deadline is not None and time() > deadline:
+            logger.warning("Test invoke finished after the deadline, not invoking")
+            return
 
+        print("Invoking for real")
+        print(Wallet.ToJson())
 
-            args = [smart_contract_hash, 'submit_prediction', [wallet_arr, bytearray(b'NEO_USD'), ts, latest_price, 5]]
-            print(args)
+        result = InvokeContract(Wallet, tx, fee)
+        if not result:
+            # Don't keep reusing an estimate that didn't get through
+            fee_estimates.invalidate(operation, params)
+        return
+    return
 
-            # Start a thread with custom code
-            d = threading.Thread(target=test_invoke_contract, args=[args])
-            d.setDaemon(True)  # daemonizing the thread will kill it when the main thread is quit
-            d.start()
-        sleep(15)
 
+class TimestepScheduler(object):
+    """ Submits the latest price of every feed once per T_n window, as early in the window as possible
+    Rather than polling on a fixed sleep, it wakes up whenever the node persists a new block
+    and at the start of every window, refreshes the price buffers in a reactor thread
+    and submits as soon as a feed's source has a snapshot inside the current window
+    Feeds that are ready at the same time go out together in one submit_predictions_batch
+    """
 
-def main():
+    def __init__(self, feeds):
+        self.feeds = feeds
+        # Start from the logged history, so a restart mid-window can still submit for it straight away
+        self.logs = dict((game_type, PriceLog(price_log_path.format(game_type))) for game_type in feeds)
+        self.buffers = dict((game_type, coinmarketcap.load_buffer(self.logs[game_type], history_depth)) for game_type in feeds)
+        self.submitted_ts = dict((game_type, None) for game_type in feeds)
+        self.polling = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        Blockchain.Default().PersistCompleted.on_change += self.on_new_block
+        self.schedule_next_window()
+
+    def on_new_block(self, block):
+        self.wake()
+
+    def schedule_next_window(self):
+        now = time()
+        reactor.callLater(window_for(int(now)) + timestep - now, self.on_new_window)
+
+    def on_new_window(self):
+        self.wake()
+        self.schedule_next_window()
+
+    def wake(self):
+        # Only one poll at a time, a block arriving mid-poll is covered by the poll in progress
+        with self.lock:
+            if self.polling:
+                return
+            self.polling = True
+        reactor.callInThread(self.poll)
+
+    def poll(self):
+        try:
+            logger.info("Block %s / %s", str(Blockchain.Default().Height), str(Blockchain.Default().HeaderHeight))
+            snapshots = self.fetch()
+            ready = []
+            for game_type in sorted(self.feeds):
+                price = self.refresh(game_type, snapshots)
+                if price is not None:
+                    ready.append((game_type, price))
+            if not ready:
+                return
+            if Blockchain.Default().Height - Wallet._current_height > 1:
+                logger.info("Wallet still syncing, submitting on the next block")
+                return
+            ts = window_for(int(time()))
+            for game_type, price in ready:
+                self.submitted_ts[game_type] = ts
+                logger.info("Submitting %s %s for T_n %s, %.0f seconds into the window", game_type, price, ts, time() - ts)
+            submit_predictions(ts, ready)
+        finally:
+            with self.lock:
+                self.polling = False
+
+    def fetch(self):
+        """ Latest snapshot of every feed, one concurrent round of requests per source """
+        snapshots = {}
+        for source, fetch_prices in SOURCES.items():
+            pairs = [(feed['ticker'], feed['convert']) for feed in self.feeds.values() if feed['source'] == source]
+            if pairs:
+                for pair, snapshot in fetch_prices(pairs).items():
+                    snapshots[(source,) + pair] = snapshot
+        return snapshots
+
+    def refresh(self, game_type, snapshots):
+        """ Updates a feed's buffer, returns the price to submit if it has one for the current window """
+        feed = self.feeds[game_type]
+        snapshot = snapshots[(feed['source'], feed['ticker'], feed['convert'])]
+        if isinstance(snapshot, Exception):
+            # The buffer may still hold a snapshot for this window, e.g. replayed from the price log after a restart
+            logger.error("Couldn't fetch the price for %s, falling back to the buffered one: %s", game_type, snapshot)
+        else:
+            if snapshot.stale:
+                # The last cached price, it's older than the latest snapshot in the buffer so it changes nothing
+                logger.warning("Couldn't refresh the price for %s, the cached one is stale", game_type)
+            self.buffers[game_type], changed = coinmarketcap.update_buffer(
+                self.buffers[game_type], max_len=history_depth, latest=snapshot, log=self.logs[game_type])
+        if self.buffers[game_type] is None:
+            return None
+        # The snapshot for the window is the latest one at or before its end
+        window = window_for(int(time()))
+        snapshot = self.buffers[game_type].closest_before(window + timestep - 1)
+        if snapshot is None:
+            return None
+        last_updated, price = snapshot
+        ts = window_for(int(last_updated))
+        if ts == self.submitted_ts[game_type]:
+            return None
+        if ts != window:
+            # The source hasn't updated since the window opened, the snapshot belongs to an expired T_n
+            return None
+        return scale_price(feed, price)
+
+
+def scale_price(feed, price):
+    """ The integer submitted for a price, e.g. 35.6042 USD at scale 1000 with floor is 35604 """
+    return BigInteger(int(ROUNDING[feed['rounding']](float(price) * feed['scale'])))
+
+
+def submit_predictions(ts, ready):
+    """ One invocation for all the feeds that are ready, submit_prediction if there is only one """
+    game_types = [game_type for game_type, price in ready]
+    if len(ready) == 1:
+        game_type, price = ready[0]
+        params = [wallet_arr, bytearray(game_type.encode('utf-8')), BigInteger(ts), price, 5]
+        args = [smart_contract_hash, 'submit_prediction', params]
+    else:
+        predictions = []
+        for game_type, price in ready:
+            predictions += [bytearray(game_type.encode('utf-8')), BigInteger(ts), price]
+        params = [wallet_arr, predictions, 5 * len(ready)]
+        args = [smart_contract_hash, 'submit_predictions_batch', params]
+    print(args)
+
+    # Give up once the window has closed. This is the only check on the window, the contract doesn't enforce it:
+    # SubmitPrediction accepts a late prediction (it only Logs "expired" in debug builds) and the fee is still paid
+    oracle_count = max(instance_oracle_count(bytearray(game_type.encode('utf-8')), ts) for game_type in game_types)
+    key = (tuple(game_types), ts)
+    pool.submit(key, test_invoke_contract, [args, oracle_count], timeout=ts + timestep - time())
+
+
+def main(feeds):
 
     settings.setup_coznet()
     # Setup the blockchain
@@ -142,10 +321,14 @@ def main():
     walletdb_loop = task.LoopingCall(Wallet.ProcessBlocks)
     walletdb_loop.start(1)
 
-    # Start a thread with custom code
-    d = threading.Thread(target=custom_background_code)
-    d.setDaemon(True)  # daemonizing the thread will kill it when the main thread is quit
-    d.start()
+    # One worker: every invocation spends inputs from the same Wallet
+    global pool
+    pool = InvocationPool(workers=1)
+
+    # Submit on new blocks and at the start of every timestep window
+    # Every feed shares this one node, blockchain and wallet
+    scheduler = TimestepScheduler(feeds)
+    scheduler.start()
 
     # Run all the things (blocking call)
     logger.info("Everything setup and running. Waiting for events...")
@@ -159,4 +342,9 @@ if __name__ == "__main__":
     wallet_hash = sys.argv[1]
     print(wallet_hash)
     wallet_arr = Helper.AddrStrToScriptHash(wallet_hash).ToArray()
-    main()
\ No newline at end of file
+    # The feeds in feeds.py, or the JSON file given here or in NEO_FUTURES_FEEDS
+    if len(sys.argv) > 2:
+        feeds = load_feeds(sys.argv[2])
+    else:
+        feeds = load_feeds()
+    main(feeds)
\ No newline at end of file
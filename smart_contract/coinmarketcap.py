@@ -11,42 +11,168 @@ So everyone will have seen a TS from CMC after the goal timestamp and therefore
 
 """
 
+import random
 import requests
 import json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from time import sleep
 
-def get_latest_price():
+api_url = 'https://api.coinmarketcap.com/v1/ticker/'
+timeout = 5 # seconds to wait for CMC to connect and to send each part of the response
+retries = 3 # attempts per ticker before giving up
+backoff = 0.5 # seconds, retries wait a random time of up to backoff * 2^attempt
+max_connections = 8 # kept open to CMC and shared by every fetch
 
-    url = 'https://api.coinmarketcap.com/v1/ticker/NEO/?convert=USD'
-    r = requests.get(url)
-    r_json = r.json()
+session = None
+executor = None
+
+
+def get_session():
+    """ One session for the whole process, so polls reuse connections instead of a new TCP/TLS handshake each time """
+    global session
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max_connections))
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=max_connections))
+    return session
+
+
+def fetch_json(url):
+    for attempt in range(retries):
+        try:
+            r = get_session().get(url, timeout=timeout)
+            r.raise_for_status()
+            return r.json()
+        except (requests.RequestException, ValueError):
+            if attempt == retries - 1:
+                raise
+            # Full jitter, so consumers that failed together don't retry together
+            sleep(random.uniform(0, backoff * 2 ** attempt))
+
+
+def get_latest_price(ticker='NEO', convert='USD'):
+
+    url = '%s%s/?convert=%s' % (api_url, ticker, convert)
+    r_json = fetch_json(url)
     last_updated = r_json[0]['last_updated']
-    price_usd = r_json[0]['price_usd']
-    return last_updated, price_usd
+    price = r_json[0]['price_' + convert.lower()]
+    return last_updated, price
 
 
-def update_buffer(buffer, max_len=10):
+def get_latest_prices(tickers):
+    """ Fetches (ticker, convert) pairs concurrently
+    Returns a dict of (ticker, convert) -> (last_updated, price), or the exception if that fetch failed
+    """
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=max_connections)
+    futures = dict((pair, executor.submit(get_latest_price, *pair)) for pair in set(tickers))
+    prices = {}
+    for pair, future in futures.items():
+        try:
+            prices[pair] = future.result()
+        except Exception as e:
+            prices[pair] = e
+    return prices
 
-    t, p = get_latest_price()
-    changed = False
 
-    if buffer is None:
-        buffer = [(t,p)]
-        changed = True
-    else:
-        (t_1, p_1) = buffer[-1]
-        if t_1 < t:
-            buffer.append((t,p))
-            changed = True
+class PriceHistory(object):
+    """ Fixed-capacity ring buffer of (last_updated, price) snapshots, oldest first
+    Appending is O(1), once full the oldest snapshot is overwritten
+    Snapshots arrive in time order, so closest_before can bisect on last_updated
+    """
+
+    def __init__(self, capacity=10):
+        self.capacity = capacity
+        self.timestamps = array('q', [0] * capacity)
+        self.prices = [None] * capacity
+        self.start = 0 # slot of the oldest snapshot
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def slot(self, index):
+        if index < 0:
+            index += self.size
+        if index < 0 or index >= self.size:
+            raise IndexError("PriceHistory index out of range")
+        return (self.start + index) % self.capacity
 
-    if len(buffer) > max_len:
-        buffer = buffer[-max_len:]
+    def __getitem__(self, index):
+        slot = self.slot(index)
+        return self.timestamps[slot], self.prices[slot]
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+    def __repr__(self):
+        return "PriceHistory(%s)" % list(self)
+
+    def append(self, last_updated, price):
+        """ Adds a snapshot if it is newer than the latest one, returns whether it was added """
+        last_updated = int(last_updated)
+        if self.size > 0 and last_updated <= self[-1][0]:
+            return False
+        if self.size < self.capacity:
+            slot = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[slot] = last_updated
+        self.prices[slot] = price
+        return True
+
+    def closest_before(self, ts):
+        """ The latest snapshot with last_updated <= ts, or None if every snapshot is after ts """
+        lo = 0
+        hi = self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[(self.start + mid) % self.capacity] <= ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        return self[lo - 1]
+
+
+def update_buffer(buffer, max_len=10, ticker='NEO', convert='USD', latest=None, log=None):
+    """ Adds the latest snapshot to a PriceHistory of depth max_len if it's newer than the last one
+    pass latest if it's already been fetched, and a PriceLog to write new snapshots through to
+    """
+
+    if latest is None:
+        latest = get_latest_price(ticker, convert)
+    t, p = latest
+
+    if buffer is None:
+        buffer = PriceHistory(max_len)
+    changed = buffer.append(t, p)
+    if changed and log is not None:
+        log.append(t, p)
 
     return buffer, changed
 
+
+def load_buffer(log, max_len=10):
+    """ Replays the last max_len snapshots of a PriceLog into a PriceHistory, None if nothing was logged """
+    snapshots = log.replay(max_len)
+    if not snapshots:
+        return None
+    buffer = PriceHistory(max_len)
+    for t, p in snapshots:
+        buffer.append(t, p)
+    return buffer
+
 if __name__ == '__main__':
     buffer = None
     while True:
-        buffer = update_buffer(buffer)
+        buffer, changed = update_buffer(buffer)
         print(buffer)
         sleep(60)
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Scaling benchmark for the submit and judge paths of the smart contracts, run on the in-memory boa emulator
+
+For every contract, prediction distribution and oracle count it plays a number of consecutive timesteps:
+every oracle submits a prediction, the instance is judged once its deadline has passed
+and (for neo_futures) every oracle claims its rewards
+It reports, per call of each of those operations, the storage ops, bytes written, estimated GAS and wall time
+
+Distributions
+unanimous - every oracle submits the same prediction
+split     - 60% submit one prediction, 40% another
+ties      - two predictions take turns to overtake each other (A B B A A B B ...), so the lead changes hands
+            on every second submission, as often as a strict majority allows
+
+Results can be saved as a JSON baseline and later runs compared against it
+any growth in storage ops, bytes or GAS per call is a regression and makes the exit status 1,
+wall time growth beyond a tolerance is only reported as it depends on the machine
+
+Usage:
+    python contract_benchmark.py --save benchmark_baseline.json
+    python contract_benchmark.py --compare benchmark_baseline.json
+    python contract_benchmark.py --contracts neo_futures.py --oracles 1 10 100 --timesteps 5
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from boa_emulator import starting_timestamp, to_bytes
+from contract_profiler import ProfilingEmulator, oracle_hash
+
+game_type = 'NEO_USD'
+timestep = 480
+
+ORACLE_COUNTS = [1, 10, 100, 1000, 10000]
+DISTRIBUTIONS = ('unanimous', 'split', 'ties')
+METRICS = ('Get', 'Put', 'Delete', 'bytes_written', 'gas')
+
+
+def prediction_for(distribution, n):
+    """ The prediction the nth oracle submits under a distribution """
+    if distribution == 'unanimous':
+        return '3560'
+    if distribution == 'split':
+        return '3560' if n % 5 < 3 else '3561'
+    # A prediction only takes the lead by getting more votes than the leader, so the trailing one has to catch up first
+    return '3560' if n % 4 in (0, 3) else '3561'
+
+
+class NeoFutures(object):
+    """ neo_futures.py: gas is sent with every submission and rewards are claimed by each oracle """
+
+    submit_op = 'submit_prediction'
+    judge_op = 'judge_instance'
+    claim_op = 'claim_rewards'
+
+    def setup(self, emulator):
+        emulator.invoke('create_new_game', [b'client', game_type])
+
+    def open_instance(self, emulator, instance_ts, oracles):
+        pass
+
+    def submit(self, emulator, oracle, instance_ts, prediction):
+        return emulator.invoke(self.submit_op, [oracle, game_type, instance_ts, prediction, 5])
+
+    def judge(self, emulator, instance_ts):
+        return emulator.invoke(self.judge_op, [game_type, instance_ts])
+
+    def claim(self, emulator, oracle, instance_ts):
+        return emulator.invoke(self.claim_op, [oracle, game_type, instance_ts])
+
+
+class OracleJudgeDapp(NeoFutures):
+    """ oracle_judge_dapp.py: every instance is commissioned first and judging settles every oracle in a sweep """
+
+    claim_op = None
+
+    def open_instance(self, emulator, instance_ts, oracles):
+        emulator.invoke('create_new_game_instance', [b'client', game_type, instance_ts])
+
+
+class OracleJudge(OracleJudgeDapp):
+    """ oracle_judge.py: collateral comes out of the oracle's balance, which is topped up outside the measurement """
+
+    def open_instance(self, emulator, instance_ts, oracles):
+        super(OracleJudge, self).open_instance(emulator, instance_ts, oracles)
+        prefix = emulator.contract.key_prefix_agent_available_balance
+        for oracle in oracles:
+            emulator.storage[to_bytes(prefix) + oracle] = to_bytes(100)
+
+    def submit(self, emulator, oracle, instance_ts, prediction):
+        return emulator.invoke(self.submit_op, [oracle, game_type, instance_ts, prediction])
+
+
+CONTRACTS = {
+    'neo_futures.py': NeoFutures,
+    'oracle_judge_dapp.py': OracleJudgeDapp,
+    'oracle_judge.py': OracleJudge,
+}
+
+
+def run(contract, distribution, n_oracles, n_timesteps):
+    """ Plays the timesteps and returns the per-call metrics of the submit, judge and claim operations """
+    adapter = CONTRACTS[contract]()
+    emulator = ProfilingEmulator(timestamp=starting_timestamp - timestep, trace_stacks=False)
+    emulator.load(contract)
+    adapter.setup(emulator)
+    oracles = [oracle_hash(n) for n in range(n_oracles)]
+    wall = {'submit': 0.0, 'judge': 0.0, 'claim': 0.0}
+
+    for t in range(n_timesteps):
+        instance_ts = starting_timestamp + t * timestep
+        emulator.set_timestamp(instance_ts + 10)
+        adapter.open_instance(emulator, instance_ts, oracles)
+
+        start = time.perf_counter()
+        for n, oracle in enumerate(oracles):
+            adapter.submit(emulator, oracle, instance_ts, prediction_for(distribution, n))
+        wall['submit'] += time.perf_counter() - start
+
+        emulator.set_timestamp(instance_ts + timestep + 10)
+        start = time.perf_counter()
+        adapter.judge(emulator, instance_ts)
+        wall['judge'] += time.perf_counter() - start
+
+        if adapter.claim_op:
+            start = time.perf_counter()
+            for oracle in oracles:
+                adapter.claim(emulator, oracle, instance_ts)
+            wall['claim'] += time.perf_counter() - start
+
+    result = {
+        'contract': contract,
+        'distribution': distribution,
+        'oracles': n_oracles,
+        'timesteps': n_timesteps,
+    }
+    for phase, operation in (('submit', adapter.submit_op), ('judge', adapter.judge_op), ('claim', adapter.claim_op)):
+        counts = emulator.operations.get(operation)
+        if counts is None:
+            continue
+        calls = counts['calls']
+        phase_result = dict((metric, counts[metric] / calls) for metric in METRICS)
+        phase_result['calls'] = calls
+        phase_result['wall_us'] = wall[phase] / calls * 1e6
+        result[phase] = phase_result
+    return result
+
+
+def result_key(result):
+    return (result['contract'], result['distribution'], result['oracles'], result['timesteps'])
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results against a baseline, returning the regressions and the slowdowns
+    storage ops, bytes and GAS are deterministic so any growth is a regression,
+    wall time depends on the machine so growth beyond the tolerance is only a slowdown
+    """
+    previous = dict((result_key(result), result) for result in baseline)
+    regressions = []
+    slowdowns = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for phase in ('submit', 'judge', 'claim'):
+            if phase not in result or phase not in old:
+                continue
+            for metric in METRICS + ('wall_us',):
+                if metric == 'wall_us':
+                    worse = result[phase][metric] > old[phase][metric] * (1 + tolerance)
+                    found = slowdowns
+                else:
+                    worse = result[phase][metric] > old[phase][metric] + 1e-9
+                    found = regressions
+                if worse:
+                    found.append("{} {} {} oracles {}: {} {:.3f} -> {:.3f}".format(
+                        result['contract'], result['distribution'], result['oracles'], phase, metric,
+                        old[phase][metric], result[phase][metric]))
+    return regressions, slowdowns
+
+
+def format_result(result):
+    parts = ["{contract} {distribution} {oracles} oracles".format(**result)]
+    for phase in ('submit', 'judge', 'claim'):
+        if phase in result:
+            metrics = result[phase]
+            parts.append("{}: {:.1f} Get {:.1f} Put {:.0f} B {:.3f} GAS {:.0f} us".format(
+                phase, metrics['Get'], metrics['Put'], metrics['bytes_written'], metrics['gas'] / 1000, metrics['wall_us']))
+    return ' | '.join(parts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the contracts' submit and judge paths across oracle counts")
+    parser.add_argument('--contracts', nargs='+', default=sorted(CONTRACTS))
+    parser.add_argument('--distributions', nargs='+', default=list(DISTRIBUTIONS))
+    parser.add_argument('--oracles', type=int, nargs='+', default=ORACLE_COUNTS)
+    parser.add_argument('--timesteps', type=int, default=3)
+    parser.add_argument('--save', help="Write the results to this JSON baseline")
+    parser.add_argument('--compare', help="Compare the results against this JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed growth in wall time per call")
+    options = parser.parse_args()
+
+    results = []
+    for contract in options.contracts:
+        for distribution in options.distributions:
+            for n_oracles in options.oracles:
+                result = run(contract, distribution, n_oracles, options.timesteps)
+                print(format_result(result))
+                results.append(result)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions, slowdowns = compare(results, json.load(f), options.tolerance)
+        for slowdown in slowdowns:
+            print("SLOWER " + slowdown)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
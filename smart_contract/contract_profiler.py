@@ -0,0 +1,226 @@
+"""
+Storage-op and GAS accounting for the smart contracts, run on the in-memory boa emulator
+
+ProfilingEmulator counts, for every Main operation, the Get/Put/Delete, concat/take/substr, Notify/Log,
+CheckWitness and GetHeight/GetHeader calls it makes, the bytes it writes to storage
+and an estimate of the GAS those calls cost on NEO 2 (plain opcodes are not counted,
+see hello_compiler.py for the static opcode count of a build)
+
+Each call is also attributed to the contract functions on the stack when it was made,
+which is written out in the folded stack format that flamegraph.pl and speedscope read, e.g.
+    submit_prediction;Main;SubmitPrediction;SetInstanceHeader;Put 1000
+
+Usage: python contract_profiler.py [--oracles 1 10 100] [--timesteps 3] [--folded neo_futures.folded]
+"""
+
+import argparse
+import sys
+
+from boa_emulator import Emulator, APPLICATION, starting_timestamp, to_bytes
+
+# Syscall and opcode prices in units of 0.001 GAS, as charged by the NEO 2 ApplicationEngine
+GAS_PRICES = {
+    'Get': 100,
+    'Delete': 100,
+    'CheckWitness': 200,
+    'GetHeader': 100,
+    'GetHeight': 1,
+    'Notify': 1,
+    'Log': 1,
+    'concat': 1,
+    'take': 1,
+    'substr': 1,
+}
+COUNTED = ('Get', 'Put', 'Delete', 'concat', 'take', 'substr', 'Notify', 'Log', 'CheckWitness', 'GetHeight', 'GetHeader')
+
+timestep = 480
+
+
+def put_price(key, value):
+    """ Storage.Put costs 1 GAS for every started KB of key and value """
+    return ((len(key) + len(value) - 1) // 1024 + 1) * 1000
+
+
+def new_counts():
+    counts = dict((name, 0) for name in COUNTED)
+    counts['calls'] = 0
+    counts['bytes_written'] = 0
+    counts['gas'] = 0
+    return counts
+
+
+class ProfilingEmulator(Emulator):
+    """
+    Emulator that keeps per-operation counts and GAS weighted call stacks
+    pass trace_stacks=False to only keep the counts, which is a lot cheaper
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.trace_stacks = kwargs.pop('trace_stacks', True)
+        super(ProfilingEmulator, self).__init__(*args, **kwargs)
+        self.operations = {}
+        self.stacks = {}
+        self.operation = None
+        self.counts = None
+
+    def invoke(self, operation, args, trigger=APPLICATION):
+        self.operation = to_bytes(operation).decode('utf-8')
+        self.counts = self.operations.setdefault(self.operation, new_counts())
+        self.counts['calls'] += 1
+        try:
+            return super(ProfilingEmulator, self).invoke(operation, args, trigger)
+        finally:
+            self.counts = None
+
+    def reset(self):
+        """ Drops the counts gathered so far but keeps the chain state """
+        self.operations = {}
+        self.stacks = {}
+
+    def record(self, name, gas, written=0):
+        counts = self.counts
+        if counts is None:
+            # Outside of Main, e.g. module level code while loading
+            return
+        counts[name] += 1
+        counts['bytes_written'] += written
+        counts['gas'] += gas
+        if not self.trace_stacks:
+            return
+        stack = ';'.join([self.operation] + self.contract_stack() + [name])
+        self.stacks[stack] = self.stacks.get(stack, 0) + gas
+
+    def contract_stack(self):
+        """ Names of the contract functions currently being executed, outermost first """
+        names = []
+        contract_globals = self.contract.__dict__
+        frame = sys._getframe(3)
+        while frame is not None:
+            if frame.f_globals is contract_globals:
+                names.append(frame.f_code.co_name)
+            elif names:
+                break
+            frame = frame.f_back
+        names.reverse()
+        return names
+
+    # Storage
+
+    def storage_get(self, key):
+        self.record('Get', GAS_PRICES['Get'])
+        return super(ProfilingEmulator, self).storage_get(key)
+
+    def storage_put(self, key, value):
+        key = to_bytes(key)
+        value = to_bytes(value)
+        self.record('Put', put_price(key, value), len(key) + len(value))
+        super(ProfilingEmulator, self).storage_put(key, value)
+
+    def storage_delete(self, key):
+        self.record('Delete', GAS_PRICES['Delete'])
+        super(ProfilingEmulator, self).storage_delete(key)
+
+    # Runtime
+
+    def notify(self, payload):
+        self.record('Notify', GAS_PRICES['Notify'])
+        super(ProfilingEmulator, self).notify(payload)
+
+    def log(self, message):
+        self.record('Log', GAS_PRICES['Log'])
+        super(ProfilingEmulator, self).log(message)
+
+    def check_witness(self, script_hash):
+        self.record('CheckWitness', GAS_PRICES['CheckWitness'])
+        return super(ProfilingEmulator, self).check_witness(script_hash)
+
+    # Blockchain
+
+    def get_height(self):
+        self.record('GetHeight', GAS_PRICES['GetHeight'])
+        return super(ProfilingEmulator, self).get_height()
+
+    def get_header(self, height):
+        self.record('GetHeader', GAS_PRICES['GetHeader'])
+        return super(ProfilingEmulator, self).get_header(height)
+
+    # Builtins
+
+    def concat(self, a, b):
+        self.record('concat', GAS_PRICES['concat'])
+        return super(ProfilingEmulator, self).concat(a, b)
+
+    def take(self, source, count):
+        self.record('take', GAS_PRICES['take'])
+        return super(ProfilingEmulator, self).take(source, count)
+
+    def substr(self, source, start, length):
+        self.record('substr', GAS_PRICES['substr'])
+        return super(ProfilingEmulator, self).substr(source, start, length)
+
+    # Reports
+
+    def report(self):
+        """ One line per operation with the average cost of a single call """
+        header = ['operation', 'calls'] + list(COUNTED) + ['bytes', 'GAS']
+        rows = [header]
+        for operation in sorted(self.operations):
+            counts = self.operations[operation]
+            calls = counts['calls'] or 1
+            row = [operation, str(counts['calls'])]
+            row += ["{:.1f}".format(counts[name] / calls) for name in COUNTED]
+            row.append("{:.1f}".format(counts['bytes_written'] / calls))
+            row.append("{:.3f}".format(counts['gas'] / calls / 1000))
+            rows.append(row)
+        widths = [max(len(row[n]) for row in rows) for n in range(len(header))]
+        return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+    def folded(self):
+        """ GAS weighted stacks (in 0.001 GAS) in the folded format used by flame graph tools """
+        return '\n'.join("{} {}".format(stack, gas) for stack, gas in sorted(self.stacks.items()) if gas > 0)
+
+
+def oracle_hash(n):
+    """ A stand-in 20 byte script hash for the nth oracle """
+    return b'oracle' + n.to_bytes(14, 'big')
+
+
+def run_scenario(emulator, n_oracles, n_timesteps, game_type='NEO_USD'):
+    """
+    Plays n_timesteps instances of a neo_futures game with n_oracles oracles each
+    two thirds of the oracles agree on the price, the rest submit another one
+    every oracle then claims its rewards for the last instance
+    """
+    emulator.invoke('create_new_game', [b'client', game_type])
+    instance_ts = starting_timestamp
+    for t in range(n_timesteps):
+        instance_ts = starting_timestamp + t * timestep
+        emulator.set_timestamp(instance_ts + 10)
+        for n in range(n_oracles):
+            prediction = '3560' if n % 3 != 2 else '3561'
+            emulator.invoke('submit_prediction', [oracle_hash(n), game_type, instance_ts, prediction, 5])
+    emulator.set_timestamp(instance_ts + timestep + 10)
+    emulator.invoke('get_prediction', [game_type, instance_ts])
+    for n in range(n_oracles):
+        emulator.invoke('claim_rewards', [oracle_hash(n), game_type, instance_ts])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Profile neo_futures operations on the boa emulator")
+    parser.add_argument('--contract', default='neo_futures.py')
+    parser.add_argument('--oracles', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--timesteps', type=int, default=3)
+    parser.add_argument('--folded', help="Write the folded stacks of the largest run to this file")
+    options = parser.parse_args()
+
+    for n_oracles in options.oracles:
+        emulator = ProfilingEmulator()
+        emulator.load(options.contract)
+        run_scenario(emulator, n_oracles, options.timesteps)
+        print("{} oracles, {} timesteps".format(n_oracles, options.timesteps))
+        print(emulator.report())
+        print()
+
+    if options.folded:
+        with open(options.folded, 'w') as f:
+            f.write(emulator.folded() + '\n')
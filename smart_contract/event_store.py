@@ -0,0 +1,211 @@
+"""
+Append-only store of judged instances, one file of fixed-size records per game type
+
+Every judged instance is (instance_ts, n_correct, prediction), all integers (prediction is the scaled price)
+The writer appends records and only fsyncs every sync_every records (or when flush is called),
+readers keep an in-memory index sorted by instance_ts and pick up whatever has been appended since they last looked,
+so looking up an instance or a range of them is a bisect rather than a scan or a call to the node
+
+If an instance is recorded twice (e.g. a backfill overlapping the live recorder) the latest record wins
+A store can be shared by threads (e.g. the webapp's request threads), each log serialises access to its index
+
+Usage:
+    store = EventStore(events_dir)
+    store.append('NEO_USD', 1519547072, 2, 3560)
+    store.get('NEO_USD', 1519547072) # (1519547072, 2, 3560)
+    store.range('NEO_USD', 1519547072, 1519548032)
+    downsample(store.range('NEO_USD', 1519547072, 1519634432), 3600) # hourly OHLC
+    import_legacy(store, 'webapp/CMC_Blockchain.txt') # the latest instance the recorder wrote before the store
+"""
+
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from struct import Struct
+
+RECORD = Struct('<qqq') # instance_ts, n_correct, prediction
+
+INTERVALS = {'hour': 3600, 'day': 86400}
+
+events_dir = os.environ.get('NEO_FUTURES_EVENTS',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'webapp', 'events'))
+
+
+class EventLog(object):
+    """ The records of one game type, indexed by instance_ts """
+
+    def __init__(self, path):
+        self.path = path
+        self.timestamps = array('q')
+        self.n_correct = array('q')
+        self.predictions = array('q')
+        self.read_offset = 0
+        self.writer = None
+        self.pending = 0
+        # Re-entrant, as append refreshes first
+        self.lock = threading.RLock()
+        self.refresh()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def index(self, ts, n_correct, prediction):
+        i = bisect_left(self.timestamps, ts)
+        if i < len(self.timestamps) and self.timestamps[i] == ts:
+            self.n_correct[i] = n_correct
+            self.predictions[i] = prediction
+        else:
+            # Instances are nearly always judged in order, so this is almost always an append
+            self.timestamps.insert(i, ts)
+            self.n_correct.insert(i, n_correct)
+            self.predictions.insert(i, prediction)
+
+    def refresh(self):
+        """ Indexes any records appended (by this or another process) since the last refresh """
+        with self.lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) < self.read_offset + RECORD.size:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self.read_offset)
+                data = f.read()
+            # A trailing partial record is still being written, leave it for the next refresh
+            complete = len(data) - len(data) % RECORD.size
+            for ts, n_correct, prediction in RECORD.iter_unpack(data[:complete]):
+                self.index(ts, n_correct, prediction)
+            self.read_offset += complete
+
+    def open_writer(self):
+        # Drop a partial record left behind by a crash before appending after it
+        if os.path.exists(self.path):
+            size = os.path.getsize(self.path)
+            if size % RECORD.size:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(size - size % RECORD.size)
+        self.writer = open(self.path, 'ab')
+
+    def append(self, ts, n_correct, prediction):
+        with self.lock:
+            if self.writer is None:
+                self.open_writer()
+            self.refresh()
+            self.writer.write(RECORD.pack(ts, n_correct, prediction))
+            self.read_offset += RECORD.size
+            self.index(ts, n_correct, prediction)
+            self.pending += 1
+
+    def flush(self):
+        with self.lock:
+            if self.writer is not None and self.pending:
+                self.writer.flush()
+                os.fsync(self.writer.fileno())
+                self.pending = 0
+
+    def record(self, i):
+        return self.timestamps[i], self.n_correct[i], self.predictions[i]
+
+    def get(self, ts):
+        with self.lock:
+            i = bisect_left(self.timestamps, ts)
+            if i < len(self.timestamps) and self.timestamps[i] == ts:
+                return self.record(i)
+            return None
+
+    def range(self, from_ts, to_ts):
+        """ Every record with from_ts <= instance_ts <= to_ts, in instance_ts order """
+        with self.lock:
+            first = bisect_left(self.timestamps, from_ts)
+            last = bisect_right(self.timestamps, to_ts)
+            return [self.record(i) for i in range(first, last)]
+
+    def latest(self):
+        with self.lock:
+            if not self.timestamps:
+                return None
+            return self.record(len(self.timestamps) - 1)
+
+
+class EventStore(object):
+
+    def __init__(self, directory=events_dir, sync_every=32):
+        self.directory = directory
+        self.sync_every = sync_every
+        self.logs = {}
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, game_type):
+        return os.path.join(self.directory, "%s.events" % game_type)
+
+    def log(self, game_type):
+        log = self.logs.get(game_type)
+        if log is None:
+            with self.lock:
+                # Another thread may have opened it while we waited
+                log = self.logs.get(game_type)
+                if log is None:
+                    log = self.logs[game_type] = EventLog(self.path(game_type))
+                    return log
+        log.refresh()
+        return log
+
+    def game_types(self):
+        return sorted(name[:-len('.events')] for name in os.listdir(self.directory) if name.endswith('.events'))
+
+    def append(self, game_type, ts, n_correct, prediction):
+        log = self.log(game_type)
+        log.append(int(ts), int(n_correct), int(prediction))
+        if log.pending >= self.sync_every:
+            log.flush()
+
+    def flush(self):
+        """ fsyncs everything appended so far, call it on a timer so quiet periods don't leave records unsynced """
+        for log in list(self.logs.values()):
+            log.flush()
+
+    def get(self, game_type, ts):
+        return self.log(game_type).get(ts)
+
+    def range(self, game_type, from_ts, to_ts):
+        return self.log(game_type).range(from_ts, to_ts)
+
+    def latest(self, game_type):
+        return self.log(game_type).latest()
+
+
+def import_legacy(store, path, game_type='NEO_USD'):
+    """ Seeds a game type with the ts,n_correct,prediction line the recorder used to keep in CMC_Blockchain.txt
+    Only if the game type has no records yet and the file exists, returns whether anything was imported
+    """
+    if store.latest(game_type) is not None or not os.path.exists(path):
+        return False
+    with open(path) as f:
+        line = f.readline().strip()
+    if not line:
+        return False
+    ts, n_correct, prediction = line.split(",")
+    store.append(game_type, ts, n_correct, prediction)
+    store.flush()
+    return True
+
+
+def downsample(records, seconds):
+    """ OHLC of the predictions in each seconds long bucket (aligned to the epoch) that has any records
+    records must be in instance_ts order, as range returns them
+    Returns [bucket_ts, open, high, low, close, count] lists
+    """
+    buckets = []
+    bucket = None
+    for ts, n_correct, prediction in records:
+        start = ts - ts % seconds
+        if bucket is None or bucket[0] != start:
+            bucket = [start, prediction, prediction, prediction, prediction, 0]
+            buckets.append(bucket)
+        if prediction > bucket[2]:
+            bucket[2] = prediction
+        if prediction < bucket[3]:
+            bucket[3] = prediction
+        bucket[4] = prediction
+        bucket[5] += 1
+    return buckets
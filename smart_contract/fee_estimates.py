@@ -0,0 +1,66 @@
+"""
+Cache of GAS and fee estimates for contract invocations, so the submitter only dry-runs with TestInvokeContract when it has to
+
+An invocation costs much the same every time it is made with the same operation and the same shape of arguments
+(the types of the arguments and the byte lengths of their values), so estimates are keyed by exactly that
+
+An estimate goes stale when
+- the contract hash changes (every estimate is dropped)
+- the oracle count of the instance moved by oracle_count_threshold or more since the estimate was made
+- it is older than max_age seconds
+- the invocation it was used for failed (call invalidate)
+"""
+
+from time import time
+
+
+def int_width(value):
+    """ Bytes the VM needs for an integer argument """
+    return (int(value) + (int(value) < 0)).bit_length() // 8 + 1
+
+
+def arg_shape(arg):
+    """ The type and size of an argument, lists are described item by item """
+    if isinstance(arg, (list, tuple)):
+        return ('list',) + tuple(arg_shape(item) for item in arg)
+    if isinstance(arg, (bytes, bytearray, str)):
+        return ('bytes', len(arg))
+    return ('int', int_width(arg))
+
+
+class FeeEstimates(object):
+
+    def __init__(self, contract_hash, oracle_count_threshold=10, max_age=3600):
+        self.contract_hash = contract_hash
+        self.oracle_count_threshold = oracle_count_threshold
+        self.max_age = max_age
+        self.estimates = {} # (operation, shape) -> (gas, fee, oracle_count, made_at)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, operation, params):
+        return operation, arg_shape(params)
+
+    def set_contract_hash(self, contract_hash):
+        """ A new contract costs whatever it costs, forget everything """
+        if contract_hash != self.contract_hash:
+            self.estimates = {}
+            self.contract_hash = contract_hash
+
+    def get(self, operation, params, oracle_count=0):
+        """ Returns (gas, fee), or None when a dry-run is needed """
+        estimate = self.estimates.get(self.key(operation, params))
+        if estimate is not None:
+            gas, fee, estimated_count, made_at = estimate
+            fresh = time() - made_at < self.max_age
+            if fresh and abs(oracle_count - estimated_count) < self.oracle_count_threshold:
+                self.hits += 1
+                return gas, fee
+        self.misses += 1
+        return None
+
+    def put(self, operation, params, gas, fee, oracle_count=0):
+        self.estimates[self.key(operation, params)] = (gas, fee, oracle_count, time())
+
+    def invalidate(self, operation, params):
+        self.estimates.pop(self.key(operation, params), None)
@@ -0,0 +1,39 @@
+"""
+The price feeds: the game types that are submitted, where each one's price comes from
+and how it is scaled into the integer prediction the contract stores
+
+Shared by the submitter, which scales prices up to submit them, and the webapp, which scales judged predictions back down
+Override the defaults with a JSON file of the same shape, passed to the submitter or named by NEO_FUTURES_FEEDS
+
+Usage:
+    feeds = load_feeds()
+    scale_for('NEO_USD', feeds) # 1000
+"""
+
+import json
+import os
+
+# game_type -> where its price comes from and how it is turned into the integer that gets submitted
+# scale multiplies the price, rounding is floor, ceil or round
+FEEDS = {
+    'NEO_USD': {'source': 'coinmarketcap', 'ticker': 'NEO', 'convert': 'USD', 'scale': 1000, 'rounding': 'floor'},
+}
+
+feeds_path = os.environ.get('NEO_FUTURES_FEEDS')
+
+
+def load_feeds(path=feeds_path):
+    if path is None:
+        return FEEDS
+    with open(path) as f:
+        return json.load(f)
+
+
+def scale_for(game_type, feeds=None):
+    """ What a game type's prices are multiplied by before submitting, 1 if it isn't a known feed """
+    if feeds is None:
+        feeds = load_feeds()
+    feed = feeds.get(game_type)
+    if feed is None:
+        return 1
+    return feed['scale']
@@ -1,4 +1,123 @@
+"""
+Compiles the smart contracts into .avm files in two build profiles
+
+production - every Log(...) statement and `if debug:` block is stripped from the source before compiling
+             this is the .avm that gets deployed, e.g. neo_futures.avm
+debug      - Log calls are kept and the contract's debug flag is switched on
+             e.g. neo_futures_debug.avm
+
+For each contract it prints the opcode count of both builds so you can see what the logging costs
+
+Usage: python hello_compiler.py [contract.py ...]
+"""
+
+import ast
+import os
+import shutil
+import sys
+import tempfile
+
 from boa.compiler import Compiler
 
-Compiler.load_and_save('neo_futures.py')
-#Compiler.load_and_save('oracle_lite.py')
\ No newline at end of file
+contracts = ['neo_futures.py', 'oracle_judge_dapp.py']
+
+PROFILES = ('production', 'debug')
+
+
+def strip_logs(source):
+    """ Replaces every statement that is just a Log(...) call with a pass, which compiles to nothing """
+    lines = source.split('\n')
+    for node in ast.walk(ast.parse(source)):
+        if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+            continue
+        func = node.value.func
+        if isinstance(func, ast.Name) and func.id == 'Log':
+            line = lines[node.lineno - 1]
+            indent = line[:len(line) - len(line.lstrip())]
+            lines[node.lineno - 1] = indent + 'pass'
+    return '\n'.join(lines)
+
+
+def strip_debug_blocks(source):
+    """ Blanks out every `if debug:` block, the flag is always off in a production build """
+    lines = source.split('\n')
+    for node in ast.walk(ast.parse(source)):
+        if not isinstance(node, ast.If) or node.orelse:
+            continue
+        if isinstance(node.test, ast.Name) and node.test.id == 'debug':
+            last = max(getattr(child, 'lineno', node.lineno) for child in ast.walk(node))
+            line = lines[node.lineno - 1]
+            indent = line[:len(line) - len(line.lstrip())]
+            lines[node.lineno - 1] = indent + 'pass'
+            for n in range(node.lineno, last):
+                lines[n] = ''
+    return '\n'.join(lines)
+
+
+def enable_debug(source):
+    """ Switches on the module level debug flag that gates the contract's diagnostics """
+    return source.replace('\ndebug = False', '\ndebug = True', 1)
+
+
+def count_ops(avm):
+    """ Counts the NEO VM opcodes in a compiled script, skipping over their operands """
+    n_ops = 0
+    i = 0
+    while i < len(avm):
+        op = avm[i]
+        i += 1
+        n_ops += 1
+        if 0x01 <= op <= 0x4B:
+            # PUSHBYTES1-75
+            i += op
+        elif op == 0x4C:
+            # PUSHDATA1
+            i += 1 + avm[i]
+        elif op == 0x4D:
+            # PUSHDATA2
+            i += 2 + int.from_bytes(avm[i:i + 2], 'little')
+        elif op == 0x4E:
+            # PUSHDATA4
+            i += 4 + int.from_bytes(avm[i:i + 4], 'little')
+        elif 0x62 <= op <= 0x65:
+            # JMP, JMPIF, JMPIFNOT, CALL
+            i += 2
+        elif op in (0x67, 0x69):
+            # APPCALL, TAILCALL
+            i += 20
+        elif op == 0x68:
+            # SYSCALL
+            i += 1 + avm[i]
+    return n_ops
+
+
+def build(path, profile):
+    """ Compiles one profile of a contract and returns the .avm bytes """
+    with open(path) as f:
+        source = f.read()
+    if profile == 'production':
+        source = strip_logs(strip_debug_blocks(source))
+        avm_path = path.replace('.py', '.avm')
+    else:
+        source = enable_debug(source)
+        avm_path = path.replace('.py', '_debug.avm')
+
+    build_dir = tempfile.mkdtemp()
+    try:
+        build_path = os.path.join(build_dir, os.path.basename(path))
+        with open(build_path, 'w') as f:
+            f.write(source)
+        return Compiler.load_and_save(build_path, output_path=avm_path)
+    finally:
+        shutil.rmtree(build_dir)
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or contracts
+    for path in paths:
+        n_ops = {}
+        for profile in PROFILES:
+            n_ops[profile] = count_ops(build(path, profile))
+        saved = n_ops['debug'] - n_ops['production']
+        print("{}: production {} ops, debug {} ops ({} ops of logging stripped)".format(
+            path, n_ops['production'], n_ops['debug'], saved))
@@ -0,0 +1,83 @@
+"""
+Bounded pool of worker threads for contract invocations
+
+- A fixed number of workers take tasks off one queue, so a burst of prices never turns into a burst of threads
+- The queue holds at most max_pending tasks, submit waits for room (up to block_timeout) and then gives up
+- Tasks are keyed, e.g. by (game_type, instance_ts), and a newer task replaces a queued one with the same key
+  so only the latest price for an instance is ever invoked
+- Every task has a deadline, tasks still queued when it passes are dropped and running tasks get it passed in
+  as deadline= so they can stop before sending a transaction that is no longer useful
+"""
+
+import collections
+import threading
+from time import time
+
+from logzero import logger
+
+
+class InvocationPool(object):
+
+    def __init__(self, workers=1, max_pending=16, timeout=240, block_timeout=5):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.block_timeout = block_timeout
+        self.pending = collections.OrderedDict() # key -> (fn, args, deadline), oldest first
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.coalesced = 0
+        self.rejected = 0
+        self.expired = 0
+        self.threads = []
+        for n in range(workers):
+            thread = threading.Thread(target=self.work, name="invocation-worker-%s" % n)
+            thread.setDaemon(True)  # daemonizing the thread will kill it when the main thread is quit
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, key, fn, args, timeout=None):
+        """ Queues fn(*args, deadline=...) and returns False if the queue stayed full for block_timeout """
+        if timeout is None:
+            timeout = self.timeout
+        task = (fn, args, time() + timeout)
+        with self.condition:
+            if key in self.pending:
+                # Newest wins, the task keeps its place in the queue
+                self.pending[key] = task
+                self.coalesced += 1
+                return True
+            give_up = time() + self.block_timeout
+            while len(self.pending) >= self.max_pending:
+                remaining = give_up - time()
+                if remaining <= 0 or self.stopped:
+                    self.rejected += 1
+                    logger.warning("Invocation queue full, dropping %s", key)
+                    return False
+                self.condition.wait(remaining)
+            self.pending[key] = task
+            self.condition.notify_all()
+        return True
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                key, (fn, args, deadline) = self.pending.popitem(last=False)
+                self.condition.notify_all()
+            if time() > deadline:
+                self.expired += 1
+                logger.warning("Invocation %s timed out in the queue", key)
+                continue
+            try:
+                fn(*args, deadline=deadline)
+            except Exception:
+                logger.exception("Invocation %s failed", key)
+
+    def stop(self):
+        """ Lets the workers finish what is queued and exit """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
@@ -24,23 +24,53 @@ from boa.blockchain.vm.Neo.Header import GetTimestamp, GetNextConsensus
 
 
 
-# key prefixes used to add structure to the Context data store
+# key tags used to add structure to the Context data store
+# high nibble is the key layout version, low nibble the record type
+key_tag_game_type = b'\x10'
+key_tag_game_count = b'\x11'
+key_tag_game_instance_header = b'\x12'
+key_tag_game_instance_votes = b'\x13'
+key_tag_game_instance_index = b'\x14'
+key_tag_game_instance_oracle = b'\x15'
+key_tag_game_instance_oracle_prediction = b'\x16'
+key_tag_game_instance_claimed = b'\x17'
+key_tag_agent_balance = b'\x18'
+key_tag_game_judge_cursor = b'\x19'
+
+# fixed widths (in bytes) of the ids that follow a tag
+game_id_width = 2
+instance_index_width = 4
+zero_padding = b'\x00\x00\x00\x00\x00\x00\x00\x00'
+
+# fields of the packed instance header, in the order they are stored
+# every field is instance_field_width bytes apart from judged (1 byte) and prediction (the rest)
+header_count = 0
+header_max = 1
+header_correct_count = 2
+header_judged = 3
+header_bounty = 4
+header_remainder = 5
+header_prediction = 6
+header_length = 7
+instance_field_width = 4
+
+# fields of the packed oracle balance record: available then locked, balance_field_width bytes each
+balance_available = 0
+balance_locked = 1
+balance_length = 2
+balance_field_width = 8
+
+# legacy key prefixes, only read for records written before the compact key layout
 key_prefix_game_type = "game_type::"
 key_prefix_game_instance = "game_instance::"
 key_prefix_game_instance_prediction = "prediction::"
-key_prefix_game_instance_judged = "judged::"
-key_prefix_game_instance_max = "max::"
-key_prefix_game_instance_index = "index::"
-key_prefix_game_instance_count = "count::"
 key_prefix_game_instance_correct_count = "correct_count::"
-key_prefix_game_instance_oracle = "oracle::"
-key_prefix_oracle = "oracle_address::"
 key_prefix_agent_available_balance = "agent_available_balance::"
 key_prefix_agent_locked_balance = "agent_locked_balance::"
 
 
 
-version = "0.0.5.13"
+version = "0.0.6.0"
 
 # Intro
 """
@@ -81,6 +111,7 @@ they sent in for this application but not any balances they've accumulated
    This balance must be > 5 NEO-GAS in order to register
    You can register by sending in 5 NEO-GAS along with your register request
    Everyone has an Available Balance and a Locked Balance
+   Both are packed into a single record per oracle, so settling an oracle is one read and one write
    N.B. We did not implement in this phase of development using --attach-gas=5
    Instead, we just mocked it by allowing an extra parameter for 'gas' in submit_prediction
    This will be replaced by NEP-5 or attach-gas in future versions
@@ -90,7 +121,33 @@ they sent in for this application but not any balances they've accumulated
    such that you maintain knowledge of the current winning prediction
    based on the most frequent prediction so far
    This means that the judging step is quite easy as you know already the winning prediction
-   You just need to separate the winners from the losers
+   and how many oracles went with it
+   Judging only records a settlement for the instance (bounty per winner and the remainder paid to the owner)
+   Every loser forfeits the collateral they locked for the instance, which makes up the bounty
+
+   N.B. Losers used to have their whole balance (available and locked) wiped out and paid to the winners,
+   as oracle_judge.py and oracle_judge_dapp.py still do. Only the collateral locked for the instance is known
+   without reading every loser's balance at judge time, so with lazy settlement that is the penalty:
+   a loser keeps the rest of their available balance and whatever they locked for other instances
+
+   [[Claiming]]
+   Winners and losers are separated lazily, one oracle at a time, by claim_rewards
+   A winner gets their collateral unlocked plus the bounty per winner, a loser has their collateral removed
+   Submitting a prediction claims the oracle's rewards for the previous instance automatically
+
+   [[Storage keys]]
+   Keys are a one-byte record tag followed by fixed-width ids rather than chained string prefixes
+   The high nibble of every tag is the key layout version (currently 1), the low nibble the record type
+   A game type is given a 2 byte id when it is created, and an instance is addressed by
+   its game id plus a 4 byte index: the number of timesteps T_n is after T_0
+   Records written with the old "game_type::..." string prefixes are still read as a fallback
+   Legacy games get an id the first time they are used, and legacy oracle balances are moved across
+   the first time they are read
+
+   [[Instance header]]
+   All of an instance's own state lives in one packed record that is read once and written once per invocation:
+   oracle count, votes for the leading prediction, correct oracle count, judged flag,
+   bounty per winner and remainder (4 bytes each, judged is 1 byte), followed by the leading prediction
       
 """
 
@@ -101,6 +158,10 @@ they sent in for this application but not any balances they've accumulated
    
    submit_prediction {{oracle}} {{game_type}} {{instance_ts}} {{prediction}} {{gas-submission}}
    > submits prediction for game instance as long as balance is high enough (including any gas sent with this transaction)
+
+   submit_predictions_batch {{oracle}} {{predictions}} {{gas-submission}}
+   > submits several predictions in one invocation, predictions is a flat list of game_type, instance_ts, prediction triples
+   > gas-submission is credited once up front and must be 0 or 5 per prediction, returns how many predictions were accepted
       
    get_prediction {{game_type}} {{instance_ts}}
    > gets finalised prediction for specific instance by judging or retrieving if already judged
@@ -116,12 +177,24 @@ they sent in for this application but not any balances they've accumulated
    
    judge_instance {{game_type}} {{instance_ts}}
    > judge the instance if time is passed the deadline and not yet judged
+   > every judgement notifies ['judged', game_type, instance_ts, n_correct, prediction]
+
+   judge_range {{game_type}} {{from_ts}} {{to_ts}}
+   > judges up to judge_range_budget consecutive instances from from_ts to to_ts whose deadline has passed
+   > the sweep resumes from a stored cursor (starting at the window the game was created in, or T_0 for older games),
+   > which only moves on when a sweep started at or before it
+   > returns the T_n the next sweep starts from
+
+   claim_rewards {{oracle}} {{game_type}} {{instance_ts}}
+   > settles the oracle's balance for a judged instance (judging it first if needed)
 
 """
 
 starting_timestamp = 1519544672 # 2018-02-25 7:44:32 AM
 collateral_requirement = 5 # 5 NEO-GAS
 timestep = 480 # Deadline in seconds
+judge_range_budget = 16 # Instances judge_range looks at per invocation
+debug = False # Log the trigger, operation and submission timing on every invocation
 owner = b'z]\x16\x10\xad\xce\xc3Q\x1a&Fv\xfa\x1as\xa4E\xa03\xef'
 GAS_ASSET_ID = b'\xe7\x2d\x28\x69\x79\xee\x6c\xb1\xb7\xe6\x5d\xfd\xdf\xb2\xe3\x84\x10\x0b\x8d\x14\x8e\x77\x58\xde\x42\xe4\x16\x8b\x71\x79\x2c\x60'
 
@@ -132,33 +205,21 @@ def Main(operation, args):
     :return: Object: Bool (success or failure) or Prediction
     """
 
-    Log("NEO-FUTURES - Oracle Judge Smart Contract")
+    if debug:
+        Log("NEO-FUTURES - Oracle Judge Smart Contract")
     trigger = GetTrigger()
     arg_len = len(args)
     if arg_len > 5:
         # Only 5 args max
         return False
 
-    if trigger == Verification():
-        Log("trigger: Verification")
-        is_owner = CheckWitness(owner)
-        if is_owner:
-            return True
-    elif trigger == Application():
-        Log("trigger: Application")
-        Log(operation)
+    if trigger == Application():
+        if debug:
+            Log("trigger: Application")
+            Log(operation)
 
-        # create_new_game {{client}} {{game_type}}
-        if operation == 'create_new_game':
-            if arg_len != 2:
-                Log("Wrong arg length")
-                return False
-            client_hash = args[0]
-            game_type = args[1]
-            if not CheckWitness(client_hash):
-                Log("Unauthorised hash")
-                return False
-            return CreateNewGame(client_hash, game_type)
+        # Operations are checked in order of how often they are invoked,
+        # so the hot submission and lookup paths pay for the fewest comparisons
 
         # submit_prediction {{oracle}} {{game_type}} {{instance_ts}} {{prediction}} {{gas-submission}}
         if operation == 'submit_prediction':
@@ -178,30 +239,75 @@ def Main(operation, args):
             if not CheckTimestamp(instance_ts):
                 Log("Not correct timestamp format")
                 return False
-            return SubmitPrediction(oracle, game_type, instance_ts, prediction, gas_submission)
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
+                return False
+            balances = GetOracleBalances(oracle)
+            result = SubmitPrediction(oracle, game_type, game_id, instance_ts, prediction, gas_submission, balances)
+            if result == True:
+                SetOracleBalances(oracle, balances)
+            return result
 
-        # judge_instance {{game_type}} {{instance_ts}}
-        if operation == 'judge_instance':
+        # get_prediction {{game_type}} {{instance_ts}}
+        if operation == 'get_prediction':
             if arg_len != 2:
                 Log("Wrong arg length")
                 return False
             game_type = args[0]
             instance_ts = args[1]
-            if isGameInstanceJudged(game_type, instance_ts):
-                Log("Already Judged")
+            if not CheckTimestamp(instance_ts):
+                Log("Not correct timestamp format")
+                return False
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
                 return False
-            return JudgeInstance(game_type, instance_ts)
+            instance_key = InstanceKey(game_id, instance_ts)
+            header = GetInstanceHeader(instance_key)
+            # Try judging to make sure judged
+            JudgeInstance(game_type, instance_key, instance_ts, header)
+            prediction = header[header_prediction]
+            if len(prediction) == 0:
+                # Instances judged before the compact key layout
+                return GetLegacyPrediction(game_type, instance_ts)
+            return prediction
+
+        # submit_predictions_batch {{oracle}} {{predictions}} {{gas-submission}}
+        if operation == 'submit_predictions_batch':
+            if arg_len != 3:
+                Log("Wrong arg length")
+                return False
+            oracle = args[0]
+            predictions = args[1]
+            gas_submission = args[2]
+            if not CheckWitness(oracle):
+                Log("Unauthorised hash")
+                return False
+            return SubmitPredictionsBatch(oracle, predictions, gas_submission)
 
-        # get_prediction {{game_type}} {{instance_ts}}
-        if operation == 'get_prediction':
-            if arg_len != 2:
+        # claim_rewards {{oracle}} {{game_type}} {{instance_ts}}
+        if operation == 'claim_rewards':
+            if arg_len != 3:
                 Log("Wrong arg length")
                 return False
-            game_type = args[0]
-            instance_ts = args[1]
+            oracle = args[0]
+            game_type = args[1]
+            instance_ts = args[2]
+            # No witness needed, rewards can only ever be paid to the oracle itself
+            if not CheckTimestamp(instance_ts):
+                Log("Not correct timestamp format")
+                return False
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
+                return False
+            instance_key = InstanceKey(game_id, instance_ts)
+            header = GetInstanceHeader(instance_key)
             # Try judging to make sure judged
-            JudgeInstance(game_type, instance_ts)
-            return GetPrediction(game_type, instance_ts)
+            JudgeInstance(game_type, instance_key, instance_ts, header)
+            balances = GetOracleBalances(oracle)
+            return ClaimRewards(oracle, instance_key, header, balances)
 
         # get_available_balance_oracle {{oracle}}
         if operation == 'get_available_balance_oracle':
@@ -209,7 +315,8 @@ def Main(operation, args):
                 Log("Wrong arg length")
                 return False
             oracle = args[0]
-            return GetOracleBalance(oracle)
+            balances = GetOracleBalances(oracle)
+            return balances[balance_available]
 
         # get_correct_oracles_for_instance {{game_type}} {{instance_ts}}
         if operation == 'get_correct_oracles_for_instance':
@@ -218,9 +325,72 @@ def Main(operation, args):
                 return False
             game_type = args[0]
             instance_ts = args[1]
+            if not CheckTimestamp(instance_ts):
+                Log("Not correct timestamp format")
+                return False
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
+                return False
+            instance_key = InstanceKey(game_id, instance_ts)
+            header = GetInstanceHeader(instance_key)
             # Try judging to make sure judged
-            JudgeInstance(game_type, instance_ts)
-            return GetCorrectOracleCountForInstance(game_type, instance_ts)
+            JudgeInstance(game_type, instance_key, instance_ts, header)
+            n_correct = header[header_correct_count]
+            if n_correct == 0:
+                # Instances judged before the compact key layout
+                return GetLegacyCorrectOracleCountForInstance(game_type, instance_ts)
+            return n_correct
+
+        # judge_instance {{game_type}} {{instance_ts}}
+        if operation == 'judge_instance':
+            if arg_len != 2:
+                Log("Wrong arg length")
+                return False
+            game_type = args[0]
+            instance_ts = args[1]
+            if not CheckTimestamp(instance_ts):
+                Log("Not correct timestamp format")
+                return False
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
+                return False
+            instance_key = InstanceKey(game_id, instance_ts)
+            header = GetInstanceHeader(instance_key)
+            if header[header_judged] == 1:
+                Log("Already Judged")
+                return False
+            return JudgeInstance(game_type, instance_key, instance_ts, header)
+
+        # judge_range {{game_type}} {{from_ts}} {{to_ts}}
+        if operation == 'judge_range':
+            if arg_len != 3:
+                Log("Wrong arg length")
+                return False
+            game_type = args[0]
+            from_ts = args[1]
+            to_ts = args[2]
+            if not CheckTimestamp(from_ts):
+                Log("Not correct timestamp format")
+                return False
+            game_id = GetGameId(game_type)
+            if game_id == 0:
+                Log("Game type not live")
+                return False
+            return JudgeRange(game_type, game_id, from_ts, to_ts)
+
+        # create_new_game {{client}} {{game_type}}
+        if operation == 'create_new_game':
+            if arg_len != 2:
+                Log("Wrong arg length")
+                return False
+            client_hash = args[0]
+            game_type = args[1]
+            if not CheckWitness(client_hash):
+                Log("Unauthorised hash")
+                return False
+            return CreateNewGame(client_hash, game_type)
 
         # debug_get_value {{key}}
         if operation == 'debug_get_value':
@@ -233,74 +403,149 @@ def Main(operation, args):
         else:
             Log("unknown op")
             return False
+    elif trigger == Verification():
+        if debug:
+            Log("trigger: Verification")
+        is_owner = CheckWitness(owner)
+        if is_owner:
+            return True
 
-def isGameTypeLive(game_type):
-    key = concat(key_prefix_game_type, game_type)
+
+def PackInt(value, width):
+    # Little-endian bytes of a non-negative value, zero padded to exactly width bytes
+    padded = concat(value, zero_padding)
+    return take(padded, width)
+
+def UnpackInt(packed, offset, width):
+    v = substr(packed, offset, width)
+    # Adding zero turns the little-endian bytes back into an integer
+    return v + 0
+
+def InstanceKey(game_id, instance_ts):
+    # Fixed-width game id followed by the fixed-width index of T_n (timesteps after T_0)
+    instance_index = (instance_ts - starting_timestamp) // timestep
+    packed_index = PackInt(instance_index, instance_index_width)
+    return concat(game_id, packed_index)
+
+def GetGameId(game_type):
+    key = concat(key_tag_game_type, game_type)
     context = GetContext()
     v = Get(context, key)
     if v == 0:
-        return False
-    else:
-        return True
+        # Games created before the compact key layout get their id on first use
+        client_hash = GetLegacyGame(game_type)
+        if client_hash == 0:
+            return 0
+        return RegisterGame(client_hash, game_type)
+    return take(v, game_id_width)
+
+def RegisterGame(client_hash, game_type):
+    context = GetContext()
+    n_games = Get(context, key_tag_game_count)
+    n_games = n_games + 1
+    Put(context, key_tag_game_count, n_games)
+    game_id = PackInt(n_games, game_id_width)
+    key = concat(key_tag_game_type, game_type)
+    v = concat(game_id, client_hash)
+    Put(context, key, v)
+    # Nothing can have been submitted before the window the game starts in, so judge_range starts there
+    height = GetHeight()
+    hdr = GetHeader(height)
+    ts = GetTimestamp(hdr)
+    first_window = ts - (ts - starting_timestamp) % timestep
+    SetJudgeCursor(game_id, first_window)
+    return game_id
 
-def isOracleRegisteredForInstance(game_type, instance_ts, oracle):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    k4 = concat(key_prefix_game_instance_oracle, oracle)
-    key = concat(k12, k4)
+def GetInstanceHeader(instance_key):
+    key = concat(key_tag_game_instance_header, instance_key)
     context = GetContext()
     v = Get(context, key)
-    if v == 0:
-        return False
-    else:
-        return True
+    header = list(length=header_length)
+    if len(v) == 0:
+        # Nobody has submitted to this instance yet
+        header[header_count] = 0
+        header[header_max] = 0
+        header[header_correct_count] = 0
+        header[header_judged] = 0
+        header[header_bounty] = 0
+        header[header_remainder] = 0
+        header[header_prediction] = ''
+        return header
+    header[header_count] = UnpackInt(v, 0, instance_field_width)
+    header[header_max] = UnpackInt(v, 4, instance_field_width)
+    header[header_correct_count] = UnpackInt(v, 8, instance_field_width)
+    header[header_judged] = UnpackInt(v, 12, 1)
+    header[header_bounty] = UnpackInt(v, 13, instance_field_width)
+    header[header_remainder] = UnpackInt(v, 17, instance_field_width)
+    prediction_length = len(v) - 21
+    header[header_prediction] = substr(v, 21, prediction_length)
+    return header
+
+def SetInstanceHeader(instance_key, header):
+    v = PackInt(header[header_count], instance_field_width)
+    field = PackInt(header[header_max], instance_field_width)
+    v = concat(v, field)
+    field = PackInt(header[header_correct_count], instance_field_width)
+    v = concat(v, field)
+    field = PackInt(header[header_judged], 1)
+    v = concat(v, field)
+    field = PackInt(header[header_bounty], instance_field_width)
+    v = concat(v, field)
+    field = PackInt(header[header_remainder], instance_field_width)
+    v = concat(v, field)
+    v = concat(v, header[header_prediction])
+    key = concat(key_tag_game_instance_header, instance_key)
+    context = GetContext()
+    Put(context, key, v)
 
-def GetOracleBalance(oracle):
-    key = concat(key_prefix_agent_available_balance, oracle)
+def GetJudgeCursor(game_id):
+    key = concat(key_tag_game_judge_cursor, game_id)
     context = GetContext()
     v = Get(context, key)
     return v
 
-def GetOracleLockedBalance(oracle):
-    key = concat(key_prefix_agent_locked_balance, oracle)
+def SetJudgeCursor(game_id, cursor):
+    key = concat(key_tag_game_judge_cursor, game_id)
     context = GetContext()
-    v = Get(context, key)
-    return v
+    Put(context, key, cursor)
 
-def GetOracleCountForInstance(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_count)
+def isOracleRegisteredForInstance(instance_key, oracle):
+    k1 = concat(key_tag_game_instance_oracle, instance_key)
+    key = concat(k1, oracle)
     context = GetContext()
     v = Get(context, key)
-    return v
+    if v == 0:
+        return False
+    else:
+        return True
 
-def GetCorrectOracleCountForInstance(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_correct_count)
+def GetOracleBalances(oracle):
+    key = concat(key_tag_agent_balance, oracle)
     context = GetContext()
     v = Get(context, key)
-    return v
-
-def SetCorrectOracleCountForInstance(game_type, instance_ts, correct_count):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_correct_count)
+    balances = list(length=balance_length)
+    if len(v) == 0:
+        balances[balance_available] = 0
+        balances[balance_locked] = 0
+        # Oracles from before the compact key layout bring their balances across on first use
+        MigrateLegacyOracle(oracle, balances)
+        return balances
+    balances[balance_available] = UnpackInt(v, 0, balance_field_width)
+    balances[balance_locked] = UnpackInt(v, 8, balance_field_width)
+    return balances
+
+def SetOracleBalances(oracle, balances):
+    v = PackInt(balances[balance_available], balance_field_width)
+    field = PackInt(balances[balance_locked], balance_field_width)
+    v = concat(v, field)
+    key = concat(key_tag_agent_balance, oracle)
     context = GetContext()
-    Put(context, key, correct_count)
+    Put(context, key, v)
 
-def IncrementCountForPrediction(game_type, instance_ts, prediction):
+def IncrementCountForPrediction(instance_key, prediction):
     # Get current count
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    k3 = concat(key_prefix_game_instance_prediction, prediction)
-    key = concat(k12, k3)
+    k1 = concat(key_tag_game_instance_votes, instance_key)
+    key = concat(k1, prediction)
     context = GetContext()
     p_count = Get(context, key)
     if p_count == 0:
@@ -311,42 +556,6 @@ def IncrementCountForPrediction(game_type, instance_ts, prediction):
     Put(context, key, p_count)
     return p_count
 
-def GetCurrentMax(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_max)
-    context = GetContext()
-    v = Get(context, key)
-    Log(key)
-    Log(v)
-    return v
-
-def UpdateMaxVotes(game_type, instance_ts, p_count):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_max)
-    context = GetContext()
-    Put(context, key, p_count)
-
-def UpdatePrediction(game_type, instance_ts, prediction):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_prediction)
-    context = GetContext()
-    Put(context, key, prediction)
-
-def GetPrediction(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_prediction)
-    context = GetContext()
-    v = Get(context, key)
-    return v
-
 def CheckTimestamp(timestamp_normalised):
     # Check that T_n is M*timestep + T_0 for some non-negative integer M
     if timestamp_normalised < starting_timestamp:
@@ -364,10 +573,11 @@ def CheckTiming(timestamp_normalised):
     height = GetHeight()
     hdr = GetHeader(height)
     ts = GetTimestamp(hdr)
-    Log(ts)
     t_n_plus_one = timestamp_normalised + timestep
-    Log(t_n_plus_one)
-    Log(timestamp_normalised)
+    if debug:
+        Log(ts)
+        Log(t_n_plus_one)
+        Log(timestamp_normalised)
     if ts > t_n_plus_one:
         return 1 # expired
     elif ts < timestamp_normalised:
@@ -375,11 +585,32 @@ def CheckTiming(timestamp_normalised):
     else:
         return 0 # all good
 
-def isGameInstanceJudged(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_judged)
+def RegisterOracle(instance_key, oracle, slot_n):
+    k1 = concat(key_tag_game_instance_index, instance_key)
+    key = concat(k1, slot_n)
+    # This registers the Oracle in the nth slot
+    context = GetContext()
+    if debug:
+        Log("Register Oracle at N")
+    Put(context, key, oracle)
+    k1 = concat(key_tag_game_instance_oracle, instance_key)
+    key = concat(k1, oracle)
+    # This registers the Oracle in the Game Instance
+    if debug:
+        Log("Register Oracle for Instance")
+    Put(context, key, 1)
+    return True
+
+def GetOracleAtIndexN(instance_key, index):
+    k1 = concat(key_tag_game_instance_index, instance_key)
+    key = concat(k1, index)
+    context = GetContext()
+    v = Get(context, key)
+    return v
+
+def isRewardClaimed(instance_key, oracle):
+    k1 = concat(key_tag_game_instance_claimed, instance_key)
+    key = concat(k1, oracle)
     context = GetContext()
     v = Get(context, key)
     if v == 0:
@@ -387,263 +618,318 @@ def isGameInstanceJudged(game_type, instance_ts):
     else:
         return True
 
-def SetGameInstanceJudged(game_type, instance_ts):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k12 = concat(k1, k2)
-    key = concat(k12, key_prefix_game_instance_judged)
+def SetRewardClaimed(instance_key, oracle):
+    k1 = concat(key_tag_game_instance_claimed, instance_key)
+    key = concat(k1, oracle)
     context = GetContext()
     Put(context, key, 1)
 
-def RegisterOracle(game_type, instance_ts, oracle, slot_n):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k3 = concat(key_prefix_game_instance_index, slot_n)
-    k12 = concat(k1, k2)
-    key = concat(k12, k3)
-    # This registers the Oracle in the nth slot
+def RegisterPrediction(instance_key, oracle, prediction):
+    k1 = concat(key_tag_game_instance_oracle_prediction, instance_key)
+    key = concat(k1, oracle)
     context = GetContext()
-    Log("Register Oracle at N")
-    Put(context, key, oracle)
-    k4 = concat(key_prefix_game_instance_oracle, oracle)
-    key = concat(k12, k4)
-    # This registers the Oracle in the Game Instance
-    context = GetContext()
-    Log("Register Oracle for Instance")
-    Put(context, key, 1)
-    # This updates the counter
-    key = concat(k12, key_prefix_game_instance_count)
+    Put(context, key, prediction)
+
+
+def GetOraclePrediction(instance_key, oracle):
+    k1 = concat(key_tag_game_instance_oracle_prediction, instance_key)
+    key = concat(k1, oracle)
     context = GetContext()
-    Log("Update Counter")
-    Put(context, key, slot_n)
-    return True
+    v = Get(context, key)
+    return v
 
-def GetOracleAtIndexN(game_type, instance_ts, index):
-    k1 = concat(key_prefix_game_type, game_type)
-    k2 = concat(key_prefix_game_instance, instance_ts)
-    k3 = concat(key_prefix_game_instance_index, index)
-    k12 = concat(k1, k2)
-    key = concat(k12, k3)
-    # This registers the Oracle in the nth slot
+# Transfers collateral from locked to available, along with any bounty won
+def UnlockCollateral(balances, bounty):
+    balances[balance_available] = balances[balance_available] + collateral_requirement + bounty
+    balances[balance_locked] = balances[balance_locked] - collateral_requirement
+
+def LockCollateral(balances):
+    balances[balance_available] = balances[balance_available] - collateral_requirement
+    balances[balance_locked] = balances[balance_locked] + collateral_requirement
+
+# Removes the collateral locked for an instance that was lost
+def ForfeitCollateral(balances):
+    balances[balance_locked] = balances[balance_locked] - collateral_requirement
+
+def AddBountyForOwner(owner_bounty):
+    balances = GetOracleBalances(owner)
+    balances[balance_available] = balances[balance_available] + owner_bounty
+    SetOracleBalances(owner, balances)
+
+def GetLegacyGame(game_type):
+    key = concat(key_prefix_game_type, game_type)
     context = GetContext()
     v = Get(context, key)
     return v
 
-def RegisterPrediction(game_type, instance_ts, oracle, prediction):
+def GetLegacyPrediction(game_type, instance_ts):
     k1 = concat(key_prefix_game_type, game_type)
     k2 = concat(key_prefix_game_instance, instance_ts)
     k12 = concat(k1, k2)
-    k3 = concat(key_prefix_game_instance_oracle, oracle)
-    k123 = concat(k12, k3)
-    key = concat(k123, key_prefix_game_instance_prediction)
+    key = concat(k12, key_prefix_game_instance_prediction)
     context = GetContext()
-    Put(context, key, prediction)
-
+    v = Get(context, key)
+    return v
 
-def GetOraclePrediction(game_type, instance_ts, oracle):
+def GetLegacyCorrectOracleCountForInstance(game_type, instance_ts):
     k1 = concat(key_prefix_game_type, game_type)
     k2 = concat(key_prefix_game_instance, instance_ts)
     k12 = concat(k1, k2)
-    k3 = concat(key_prefix_game_instance_oracle, oracle)
-    k123 = concat(k12, k3)
-    key = concat(k123, key_prefix_game_instance_prediction)
+    key = concat(k12, key_prefix_game_instance_correct_count)
     context = GetContext()
     v = Get(context, key)
     return v
 
-# Transfers collateral from locked to available
-def UnlockCollateral(oracle):
-    available = GetOracleBalance(oracle)
-    locked = GetOracleLockedBalance(oracle)
-    new_available = available + collateral_requirement
-    new_locked = locked - collateral_requirement
-    UpdateAvailableBalance(oracle, new_available)
-    UpdateLockedBalance(oracle, new_locked)
-
-def UpdateAvailableBalance(oracle, balance):
-    key = concat(key_prefix_agent_available_balance, oracle)
-    context = GetContext()
-    Put(context, key, balance)
-
-def UpdateLockedBalance(oracle, balance):
-    key = concat(key_prefix_agent_locked_balance, oracle)
+def MigrateLegacyOracle(oracle, balances):
     context = GetContext()
-    Put(context, key, balance)
-
-def LockCollateral(oracle):
-    available = GetOracleBalance(oracle)
-    locked = GetOracleLockedBalance(oracle)
-    new_available = available - collateral_requirement
-    new_locked = locked + collateral_requirement
-    UpdateAvailableBalance(oracle, new_available)
-    UpdateLockedBalance(oracle, new_locked)
-
-def WipeOutBalances(oracle):
-    UpdateAvailableBalance(oracle, 0)
-    UpdateLockedBalance(oracle, 0)
-
-def AddBountyForOwner(owner_bounty):
-    current_balance = GetOracleBalance(owner)
-    new_balance = current_balance + owner_bounty
-    UpdateAvailableBalance(owner, new_balance)
+    key_available = concat(key_prefix_agent_available_balance, oracle)
+    legacy_available = Get(context, key_available)
+    key_locked = concat(key_prefix_agent_locked_balance, oracle)
+    legacy_locked = Get(context, key_locked)
+    if legacy_available == 0:
+        if legacy_locked == 0:
+            return False
+    balances[balance_available] = balances[balance_available] + legacy_available
+    balances[balance_locked] = balances[balance_locked] + legacy_locked
+    SetOracleBalances(oracle, balances)
+    Delete(context, key_available)
+    Delete(context, key_locked)
+    return True
 
 def CreateNewGame(client_hash, game_type):
-    if isGameTypeLive(game_type):
+    if GetGameId(game_type) != 0:
         return "Game is Already Live"
     else:
-        key = concat(key_prefix_game_type,game_type)
-        context = GetContext()
-        Put(context, key, client_hash)
+        RegisterGame(client_hash, game_type)
     return "Success"
 
 # judge_instance {{game_type}} {{instance_ts}}
-def JudgeInstance(game_type, instance_ts):
-    if isGameInstanceJudged(game_type, instance_ts):
+def JudgeInstance(game_type, instance_key, instance_ts, header):
+    if header[header_judged] == 1:
         return "Already Judged"
-    # Separate Winners from Losers
-    correct_prediction = GetPrediction(game_type, instance_ts)
-    n_oracles_for_instance = GetOracleCountForInstance(game_type, instance_ts)
-    n_correct = 0
-    total_bounty = 0
-
-    index = 0
-    while index < n_oracles_for_instance:
-        index = index + 1
-        oracle = GetOracleAtIndexN(game_type, instance_ts, index)
-        oracle_prediction = GetOraclePrediction(game_type, instance_ts, oracle)
-        if oracle_prediction == correct_prediction:
-            # Add to Winners
-            # collateral is moved from locked into available
-            UnlockCollateral(oracle)
-            n_correct = n_correct + 1
-        else:
-            # Add to Losers
-            # Both Available and Locked Balance is removed and added to Winner collection
-            oracle_available_balance = GetOracleBalance(oracle)
-            oracle_locked_balance = GetOracleLockedBalance(oracle)
-
-            total_bounty = total_bounty + oracle_available_balance + oracle_locked_balance
-            WipeOutBalances(oracle)
-
+    # The running tally kept by IncrementCountForPrediction and the instance header
+    # already tells us the winning prediction and how many oracles went with it
+    correct_prediction = header[header_prediction]
+    n_correct = header[header_max]
     if n_correct == 0:
         return "Nothing correct"
+    n_oracles_for_instance = header[header_count]
 
+    # Every loser forfeits the collateral they locked for this instance (not their whole balance, see [[Judging]])
+    # Balances are settled later by each oracle through claim_rewards
+    total_bounty = (n_oracles_for_instance - n_correct) * collateral_requirement
     bounty_per_correct_oracle = total_bounty // n_correct
     owner_bounty = total_bounty % n_correct
     AddBountyForOwner(owner_bounty)
 
-    Log("n_correct")
-    Log(n_correct)
+    if debug:
+        Log("n_correct")
+        Log(n_correct)
+
+    # Each field is its own item, so listeners read them as they are rather than splitting a string
+    Notify(['judged', game_type, instance_ts, n_correct, correct_prediction])
+    # Record the settlement and set Game to be Judged (no more judging allowed)
+    header[header_correct_count] = n_correct
+    header[header_bounty] = bounty_per_correct_oracle
+    header[header_remainder] = owner_bounty
+    header[header_judged] = 1
+    SetInstanceHeader(instance_key, header)
+    return True
 
-    SetCorrectOracleCountForInstance(game_type, instance_ts, n_correct)
 
-    # Loop again
-    index = 0
-    while index < n_oracles_for_instance:
-        index = index + 1
-        oracle = GetOracleAtIndexN(game_type, instance_ts, index)
-        oracle_prediction = GetOraclePrediction(game_type, instance_ts, oracle)
-        if oracle_prediction == correct_prediction:
-            oracle_available_balance = GetOracleBalance(oracle)
-            oracle_available_balance = oracle_available_balance + bounty_per_correct_oracle
-            UpdateAvailableBalance(oracle, oracle_available_balance)
-
-    sep = "SEPARATOR"
-    notification = concat(instance_ts, sep)
-    notification = concat(notification, n_correct)
-    notification = concat(notification, sep)
-    notification = concat(notification, correct_prediction)
-    Notify(notification)
-    # Set Game to be Judged (no more judging allowed)
-    SetGameInstanceJudged(game_type, instance_ts)
+# judge_range {{game_type}} {{from_ts}} {{to_ts}}
+def JudgeRange(game_type, game_id, from_ts, to_ts):
+    # Everything before the cursor has already been swept
+    cursor = GetJudgeCursor(game_id)
+    if cursor == 0:
+        # Games registered before the cursor was set on creation, their backlog starts at T_0
+        cursor = starting_timestamp
+    instance_ts = from_ts
+    if cursor > instance_ts:
+        instance_ts = cursor
+
+    # Only instances whose submission window has closed can be judged
+    height = GetHeight()
+    hdr = GetHeader(height)
+    ts = GetTimestamp(hdr)
+    last_closed = ts - timestep
+    if to_ts > last_closed:
+        to_ts = last_closed
+    # and at most judge_range_budget of them per invocation
+    last_in_budget = instance_ts + (judge_range_budget - 1) * timestep
+    if to_ts > last_in_budget:
+        to_ts = last_in_budget
+
+    while instance_ts <= to_ts:
+        instance_key = InstanceKey(game_id, instance_ts)
+        header = GetInstanceHeader(instance_key)
+        JudgeInstance(game_type, instance_key, instance_ts, header)
+        instance_ts = instance_ts + timestep
+
+    # Only move the cursor on if this sweep carried on from it,
+    # a sweep that started later leaves the instances before it unswept
+    if instance_ts > cursor:
+        if from_ts <= cursor:
+            SetJudgeCursor(game_id, instance_ts)
+    return instance_ts
+
+
+# claim_rewards {{oracle}} {{game_type}} {{instance_ts}}
+def ClaimRewards(oracle, instance_key, header, balances):
+    if header[header_judged] == 0:
+        return "Game Instance not yet judged"
+    if not isOracleRegisteredForInstance(instance_key, oracle):
+        return "Not registered"
+    if isRewardClaimed(instance_key, oracle):
+        return "Already claimed"
+    correct_prediction = header[header_prediction]
+    oracle_prediction = GetOraclePrediction(instance_key, oracle)
+    if oracle_prediction == correct_prediction:
+        # Winner: collateral is moved from locked into available along with their share of the bounty
+        bounty_per_correct_oracle = header[header_bounty]
+        UnlockCollateral(balances, bounty_per_correct_oracle)
+    else:
+        # Loser: collateral was paid out as bounty to the winners
+        ForfeitCollateral(balances)
+    SetOracleBalances(oracle, balances)
+    SetRewardClaimed(instance_key, oracle)
     return True
 
 
-# submit_prediction {{oracle}} {{game_type}} {{instance_ts}} {{prediction}} {{gas-submission}}
-def SubmitPrediction(oracle, game_type, instance_ts, prediction, gas_submission):
+# submit_predictions_batch {{oracle}} {{predictions}} {{gas-submission}}
+def SubmitPredictionsBatch(oracle, predictions, gas_submission):
+    n_fields = len(predictions)
+    n_predictions = n_fields // 3
+    if n_predictions * 3 != n_fields:
+        return "Predictions must be game_type, instance_ts, prediction triples"
+    if gas_submission != 0:
+        if gas_submission != n_predictions * collateral_requirement:
+            return "Wrong amount of NEO GAS Sent"
 
-    #Add in auto-judging
-    prev_instance = instance_ts - timestep
-    JudgeInstance(game_type,prev_instance)
+    # The oracle's balances are read once and shared by every prediction in the batch
+    balances = GetOracleBalances(oracle)
+    balances[balance_available] = balances[balance_available] + gas_submission
+
+    n_accepted = 0
+    game_type = ''
+    game_id = 0
+    index = 0
+    while index < n_fields:
+        next_game_type = predictions[index]
+        instance_ts = predictions[index + 1]
+        prediction = predictions[index + 2]
+        index = index + 3
+        if next_game_type != game_type:
+            game_type = next_game_type
+            game_id = GetGameId(game_type)
+        if game_id != 0:
+            if CheckTimestamp(instance_ts):
+                result = SubmitPrediction(oracle, game_type, game_id, instance_ts, prediction, 0, balances)
+                if result == True:
+                    n_accepted = n_accepted + 1
+
+    SetOracleBalances(oracle, balances)
+    return n_accepted
 
-    # Trivial TODO
-    # ADD IN GAME_TYPE CHECK
 
-    Log("gas_submission")
-    Log(gas_submission)
+# submit_prediction {{oracle}} {{game_type}} {{instance_ts}} {{prediction}} {{gas-submission}}
+# Works on the oracle's balances in memory, the caller writes them back if the prediction is accepted
+def SubmitPrediction(oracle, game_type, game_id, instance_ts, prediction, gas_submission, balances):
 
-    # Check T_n relative to current TS()
-    height = GetHeight()
-    hdr = GetHeader(height)
-    ts = GetTimestamp(hdr)
-    Log(ts)
-    t_n_plus_one = instance_ts + timestep
-    Log(t_n_plus_one)
-    Log(instance_ts)
-    if ts > t_n_plus_one:
-        #return 1  # expired
-        Log("expired")
-    elif ts < instance_ts:
-        #return 2  # too early to submit, ignore
-        Log("too early")
-    else:
-        #return 0  # all good
-        Log("Sweet spot")
+    instance_key = InstanceKey(game_id, instance_ts)
 
-    Log(instance_ts)
+    #Add in auto-judging
+    if instance_ts > starting_timestamp:
+        prev_instance = instance_ts - timestep
+        prev_instance_key = InstanceKey(game_id, prev_instance)
+        prev_header = GetInstanceHeader(prev_instance_key)
+        judged = JudgeInstance(game_type, prev_instance_key, prev_instance, prev_header)
+        if judged == True:
+            if oracle == owner:
+                # Judging credited the owner's remainder in storage, which the caller is about to
+                # overwrite with these balances, so credit it here as well
+                balances[balance_available] = balances[balance_available] + prev_header[header_remainder]
+        # and settle this oracle's balance for it
+        ClaimRewards(oracle, prev_instance_key, prev_header, balances)
+
+    if debug:
+        Log("gas_submission")
+        Log(gas_submission)
+
+        # Check T_n relative to current TS()
+        height = GetHeight()
+        hdr = GetHeader(height)
+        ts = GetTimestamp(hdr)
+        Log(ts)
+        t_n_plus_one = instance_ts + timestep
+        Log(t_n_plus_one)
+        Log(instance_ts)
+        if ts > t_n_plus_one:
+            #return 1  # expired
+            Log("expired")
+        elif ts < instance_ts:
+            #return 2  # too early to submit, ignore
+            Log("too early")
+        else:
+            #return 0  # all good
+            Log("Sweet spot")
 
-    if isGameInstanceJudged(game_type, instance_ts):
+        Log(instance_ts)
+
+    header = GetInstanceHeader(instance_key)
+    if header[header_judged] == 1:
         return "Game Instance already judged" # Ignore submission
     else:
 
         # ASSERT: current timestamp is in the sweet spot between T_n and T_n+1
 
         # Check if Oracle already registered
-        if isOracleRegisteredForInstance(game_type, instance_ts, oracle):
+        if isOracleRegisteredForInstance(instance_key, oracle):
             return "Already registered"
-        current_oracle_balance = GetOracleBalance(oracle)
-        n_oracles_for_instance = GetOracleCountForInstance(game_type, instance_ts)
-        Log(gas_submission)
+        current_oracle_balance = balances[balance_available]
+        n_oracles_for_instance = header[header_count]
+        if debug:
+            Log(gas_submission)
         if gas_submission == 0:
             if current_oracle_balance >= collateral_requirement:
                 new_count = n_oracles_for_instance + 1
-                RegisterOracle(game_type, instance_ts, oracle, new_count)
+                RegisterOracle(instance_key, oracle, new_count)
+                header[header_count] = new_count
             else:
                 # No assets sent and existing balance too low
                 return "Not enough balance to register"
         elif gas_submission == 5:
-                Log(current_oracle_balance)
                 current_oracle_balance = current_oracle_balance + gas_submission
-                Log(current_oracle_balance)
-                key = concat(key_prefix_agent_available_balance, oracle)
-                Log("updating balance")
-                # Updates Balance of Oracle
-                context = GetContext()
-                Put(context, key, current_oracle_balance)
+                balances[balance_available] = current_oracle_balance
                 new_count = n_oracles_for_instance + 1
-                Log(new_count)
-                RegisterOracle(game_type, instance_ts, oracle, new_count)
-                Log("registered oracle")
+                if debug:
+                    Log(current_oracle_balance)
+                    Log("updating balance")
+                    Log(new_count)
+                RegisterOracle(instance_key, oracle, new_count)
+                header[header_count] = new_count
+                if debug:
+                    Log("registered oracle")
         else:
             return "Wrong amount of NEO GAS Sent"
 
-        locked = GetOracleLockedBalance(oracle)
-        new_locked = locked + 5
-        UpdateLockedBalance(oracle, new_locked)
-        new_available = current_oracle_balance - 5
-        UpdateAvailableBalance(oracle, new_available)
+        LockCollateral(balances)
 
         # Now to submit prediction if no errors
-        RegisterPrediction(game_type, instance_ts, oracle, prediction)
-        p_count = IncrementCountForPrediction(game_type, instance_ts, prediction)
-        Log("Registered and incremented pcount")
-        max_so_far = GetCurrentMax(game_type, instance_ts)
-        Log("max and pcount:")
-        Log(max_so_far)
-        Log(p_count)
+        # Claims compare predictions with == (NUMEQUAL), so tally the shortest byte array for the number,
+        # otherwise an alias like b'\x01\x00' is counted apart from b'\x01' yet still claims as a winner
+        prediction = prediction + 0
+        RegisterPrediction(instance_key, oracle, prediction)
+        p_count = IncrementCountForPrediction(instance_key, prediction)
+        max_so_far = header[header_max]
+        if debug:
+            Log("Registered and incremented pcount")
+            Log("max and pcount:")
+            Log(max_so_far)
+            Log(p_count)
         if p_count > max_so_far:
             # New Current Winner
-            UpdateMaxVotes(game_type, instance_ts, p_count)
-            UpdatePrediction(game_type, instance_ts, prediction)
+            header[header_max] = p_count
+            header[header_prediction] = prediction
+        SetInstanceHeader(instance_key, header)
         return True
-
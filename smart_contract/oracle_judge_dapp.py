@@ -439,11 +439,11 @@ def GetOraclePrediction(game_type, instance_ts, oracle):
     v = Get(context, key)
     return v
 
-# Transfers collateral from locked to available
-def UnlockCollateral(oracle):
+# Transfers collateral from locked to available, along with any bounty won
+def UnlockCollateral(oracle, bounty):
     available = GetOracleBalance(oracle)
     locked = GetOracleLockedBalance(oracle)
-    new_available = available + collateral_requirement
+    new_available = available + collateral_requirement + bounty
     new_locked = locked - collateral_requirement
     UpdateAvailableBalance(oracle, new_available)
     UpdateLockedBalance(oracle, new_locked)
@@ -503,12 +503,19 @@ def CreateNewGameInstance(client_hash, game_type, instance_ts):
 def JudgeInstance(game_type, instance_ts):
     if isGameInstanceJudged(game_type, instance_ts):
         return "Already Judged"
-    # Separate Winners from Losers
+    # The running tally kept by IncrementCountForPrediction and UpdateMaxVotes
+    # already tells us the winning prediction and how many oracles went with it
     correct_prediction = GetPrediction(game_type, instance_ts)
+    n_correct = GetCurrentMax(game_type, instance_ts)
+    if n_correct == 0:
+        return "Nothing correct"
     n_oracles_for_instance = GetOracleCountForInstance(game_type, instance_ts)
-    n_correct = 0
     total_bounty = 0
 
+    # Separate Winners from Losers in a single sweep
+    # Winners are remembered so they can be paid once the total bounty is known
+    winners = list(length=n_correct)
+    n_winners = 0
     index = 0
     while index < n_oracles_for_instance:
         index = index + 1
@@ -516,9 +523,11 @@ def JudgeInstance(game_type, instance_ts):
         oracle_prediction = GetOraclePrediction(game_type, instance_ts, oracle)
         if oracle_prediction == correct_prediction:
             # Add to Winners
-            # collateral is moved from locked into available
-            UnlockCollateral(oracle)
-            n_correct = n_correct + 1
+            # n_correct only counts byte-identical predictions, so a byte alias submitted before predictions
+            # were tallied by value must not write past the end of winners: it is neither paid nor wiped out
+            if n_winners < n_correct:
+                winners[n_winners] = oracle
+                n_winners = n_winners + 1
         else:
             # Add to Losers
             # Both Available and Locked Balance is removed and added to Winner collection
@@ -537,16 +546,13 @@ def JudgeInstance(game_type, instance_ts):
 
     SetCorrectOracleCountForInstance(game_type, instance_ts, n_correct)
 
-    # Loop again
+    # Pay the Winners
+    # collateral is moved from locked into available along with their share of the bounty
     index = 0
-    while index < n_oracles_for_instance:
+    while index < n_winners:
+        oracle = winners[index]
+        UnlockCollateral(oracle, bounty_per_correct_oracle)
         index = index + 1
-        oracle = GetOracleAtIndexN(game_type, instance_ts, index)
-        oracle_prediction = GetOraclePrediction(game_type, instance_ts, oracle)
-        if oracle_prediction == correct_prediction:
-            oracle_available_balance = GetOracleBalance(oracle)
-            oracle_available_balance = oracle_available_balance + bounty_per_correct_oracle
-            UpdateAvailableBalance(oracle, oracle_available_balance)
 
     # Set Game to be Judged (no more judging allowed)
     SetGameInstanceJudged(game_type, instance_ts)
@@ -601,6 +607,8 @@ def SubmitPrediction(oracle, game_type, instance_ts, prediction, gas_submission)
         UpdateAvailableBalance(oracle, new_available)
 
         # Now to submit prediction if no errors
+        # Winners are picked with == (NUMEQUAL), so tally the shortest byte array for the number
+        prediction = prediction + 0
         RegisterPrediction(game_type, instance_ts, oracle, prediction)
         p_count = IncrementCountForPrediction(game_type, instance_ts, prediction)
         Log("Registered and incremented pcount")
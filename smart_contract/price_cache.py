@@ -0,0 +1,142 @@
+"""
+Price cache shared by every process on the box that wants CMC prices (the submitter, the watcher and the webapp)
+
+The cache is a JSON file of (ticker, convert) -> last_updated, price and when it was fetched
+A price younger than ttl seconds is served from the file, otherwise one process refreshes it:
+refreshes are serialised on a lock file and re-check the cache once they hold the lock,
+so however many consumers miss at the same time CMC only sees one request per ticker per ttl
+
+If a refresh fails the last cached price is served instead, flagged as stale, and the pair isn't
+tried again for retry_after seconds, so an outage at CMC doesn't have every consumer queueing on the lock to retry it
+Readers that must never call CMC themselves (the webapp) pass refresh=False and only ever read the file
+
+The file is replaced atomically, so readers never need the lock
+
+Usage:
+    last_updated, price = get_price('NEO', 'USD')
+    get_price('NEO', 'USD', refresh=False).stale
+"""
+
+import fcntl
+import json
+import os
+from time import time
+
+import coinmarketcap
+
+cache_path = os.environ.get('NEO_FUTURES_PRICE_CACHE', '/tmp/neo_futures_prices.json')
+ttl = 30 # seconds, well under CMC's c. 5 minute update interval
+retry_after = 60 # seconds before a pair whose refresh failed is tried again
+
+
+class PriceUnavailable(Exception):
+    """ Nothing is cached for the pair (and refreshing it failed, if it was tried) """
+
+
+class Snapshot(tuple):
+    """ (last_updated, price), stale if it is older than the ttl, e.g. because refreshing it failed """
+
+    def __new__(cls, last_updated, price, stale=False):
+        snapshot = tuple.__new__(cls, (last_updated, price))
+        snapshot.stale = stale
+        return snapshot
+
+
+def cache_key(ticker, convert):
+    return "%s/%s" % (ticker, convert)
+
+
+def read_cache(path=cache_path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_cache(cache, path=cache_path):
+    temp_path = "%s.%s.tmp" % (path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(temp_path, path)
+
+
+def cached_snapshot(entry, key, stale):
+    if entry is None or 'price' not in entry:
+        error = entry.get('error') if entry is not None else None
+        return PriceUnavailable("No price cached for %s%s" % (key, ", last refresh failed: %s" % error if error else ""))
+    return Snapshot(entry['last_updated'], entry['price'], stale)
+
+
+def fresh_prices(cache, pairs, now, ttl):
+    """ The pairs that don't need refreshing: fetched within ttl, or failed within retry_after (served stale) """
+    prices = {}
+    for pair in pairs:
+        key = cache_key(*pair)
+        entry = cache.get(key)
+        if entry is None:
+            continue
+        if 'fetched_at' in entry and now - entry['fetched_at'] < ttl:
+            prices[pair] = cached_snapshot(entry, key, False)
+        elif 'failed_at' in entry and now - entry['failed_at'] < retry_after:
+            prices[pair] = cached_snapshot(entry, key, True)
+    return prices
+
+
+def read_prices(pairs, ttl=ttl, path=cache_path):
+    """ Whatever is cached for the pairs, without ever refreshing them """
+    cache = read_cache(path)
+    now = time()
+    prices = {}
+    for pair in set(pairs):
+        key = cache_key(*pair)
+        entry = cache.get(key)
+        stale = entry is not None and now - entry.get('fetched_at', 0) >= ttl
+        prices[pair] = cached_snapshot(entry, key, stale)
+    return prices
+
+
+def get_prices(pairs, ttl=ttl, path=cache_path, refresh=True):
+    """ Same as coinmarketcap.get_latest_prices, but served from the shared cache when it is fresh enough
+    Returns a dict of (ticker, convert) -> Snapshot, or PriceUnavailable if there's no price for that pair
+    """
+    if not refresh:
+        return read_prices(pairs, ttl, path)
+    pairs = set(pairs)
+    prices = fresh_prices(read_cache(path), pairs, time(), ttl)
+    if len(prices) == len(pairs):
+        return prices
+
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Whoever held the lock before us may have refreshed (or given up on) these already
+            cache = read_cache(path)
+            prices = fresh_prices(cache, pairs, time(), ttl)
+            stale = [pair for pair in pairs if pair not in prices]
+            if stale:
+                fetched_at = time()
+                for pair, snapshot in coinmarketcap.get_latest_prices(stale).items():
+                    key = cache_key(*pair)
+                    if isinstance(snapshot, Exception):
+                        # Keep the last price and back off, rather than every consumer retrying CMC in turn
+                        entry = cache.setdefault(key, {})
+                        entry['failed_at'] = fetched_at
+                        entry['error'] = str(snapshot)
+                        prices[pair] = cached_snapshot(entry, key, True)
+                    else:
+                        last_updated, price = snapshot
+                        cache[key] = {'last_updated': last_updated, 'price': price, 'fetched_at': fetched_at}
+                        prices[pair] = Snapshot(last_updated, price)
+                write_cache(cache, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return prices
+
+
+def get_price(ticker='NEO', convert='USD', ttl=ttl, path=cache_path, refresh=True):
+    """ Snapshot (last_updated, price) for one ticker, raises PriceUnavailable if there's none """
+    snapshot = get_prices([(ticker, convert)], ttl, path, refresh)[(ticker, convert)]
+    if isinstance(snapshot, Exception):
+        raise snapshot
+    return snapshot
@@ -0,0 +1,95 @@
+"""
+Append-only, memory-mapped log of (last_updated, price) snapshots, so price history survives a restart
+
+The file is a header followed by fixed-size records, each with a CRC32 so that a record torn by a crash is spotted
+The file grows a chunk of records at a time and unused records are all zeros,
+so replaying stops at the first empty or corrupt record and appending carries on from there
+
+Usage:
+    log = PriceLog('prices_NEO_USD.log')
+    log.append(1519544672, '35.604')
+    log.replay() # [(1519544672, '35.604')]
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b'NFPRICE1'
+price_width = 24 # bytes of ascii a record has for the price
+RECORD = struct.Struct('<q%dsI4x' % price_width) # last_updated, price (ascii, zero padded), crc32 of the first two
+PAYLOAD = struct.Struct('<q%ds' % price_width) # the part of a record its crc32 covers
+chunk_records = 1024 # records added each time the file grows
+
+
+class PriceLog(object):
+
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) < len(MAGIC)
+        self.f = open(path, 'w+b' if new else 'r+b')
+        if new:
+            self.f.write(MAGIC)
+            self.f.truncate(len(MAGIC) + chunk_records * RECORD.size)
+            self.f.flush()
+        self.map = mmap.mmap(self.f.fileno(), 0)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a price log" % path)
+        self.count = self.recover()
+
+    def offset(self, index):
+        return len(MAGIC) + index * RECORD.size
+
+    def read(self, index):
+        """ The snapshot in a record, or None if the record is empty or torn """
+        last_updated, price, crc = RECORD.unpack_from(self.map, self.offset(index))
+        if last_updated == 0 or crc != zlib.crc32(PAYLOAD.pack(last_updated, price)):
+            return None
+        return last_updated, price.rstrip(b'\x00').decode('ascii')
+
+    def recover(self):
+        """ Counts the intact records from the start and wipes everything after the first empty or torn one """
+        count = 0
+        while self.offset(count + 1) <= len(self.map) and self.read(count) is not None:
+            count += 1
+        tail = self.offset(count)
+        if self.map[tail:].strip(b'\x00'):
+            self.map[tail:] = bytes(len(self.map) - tail)
+            self.map.flush()
+        return count
+
+    def __len__(self):
+        return self.count
+
+    def replay(self, limit=None):
+        """ The logged snapshots in the order they were appended, only the last limit of them if given """
+        first = 0
+        if limit is not None:
+            first = max(0, self.count - limit)
+        return [self.read(index) for index in range(first, self.count)]
+
+    def append(self, last_updated, price):
+        if self.offset(self.count + 1) > len(self.map):
+            self.grow()
+        price = str(price).encode('ascii')
+        if len(price) > price_width:
+            # struct would silently cut it short
+            raise ValueError("Price %r is longer than the %s bytes a record holds" % (price, price_width))
+        packed = PAYLOAD.pack(int(last_updated), price)
+        offset = self.offset(self.count)
+        RECORD.pack_into(self.map, offset, int(last_updated), price, zlib.crc32(packed))
+        # Flush just the pages holding the record
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self.map.flush(start, offset + RECORD.size - start)
+        self.count += 1
+
+    def grow(self):
+        self.map.close()
+        self.f.truncate(self.offset(self.count) + chunk_records * RECORD.size)
+        self.map = mmap.mmap(self.f.fileno(), 0)
+
+    def close(self):
+        self.map.close()
+        self.f.close()
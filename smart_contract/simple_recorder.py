@@ -1,6 +1,14 @@
 """
 Simply looks out for Notify events from the chosen smart contract
+and records every judged instance in the event store that the webapp reads from
+
+Usage:
+    python simple_recorder.py
+    python simple_recorder.py backfill {{from_height}} [{{to_height}}] [{{game_type}} ...]
+    > records every instance judged between those block heights from the local blockchain, without listening
+    > for the game types given, or else every game type already in the event store (NEO_USD if it's empty)
 """
+import sys
 import threading
 from time import sleep
 
@@ -12,7 +20,10 @@ from neo.Network.NodeLeader import NodeLeader
 from neo.Core.Blockchain import Blockchain
 from neo.Implementations.Blockchains.LevelDB.LevelDBBlockchain import LevelDBBlockchain
 from neo.Settings import settings
+from neo.Core.State.StorageKey import StorageKey
 from neocore.BigInteger import BigInteger
+from neocore.UInt160 import UInt160
+from event_store import EventStore
 
 
 # If you want the log messages to also be saved in a logfile, enable the
@@ -20,7 +31,17 @@ from neocore.BigInteger import BigInteger
 # settings.set_logfile("/tmp/logfile.log", max_bytes=1e7, backup_count=3)
 
 # Setup the smart contract instance
-smart_contract = SmartContract("d5537fc7dea2150d250e9d5f0cd67b8b248b3fdf")
+smart_contract_hash = "d5537fc7dea2150d250e9d5f0cd67b8b248b3fdf"
+smart_contract = SmartContract(smart_contract_hash)
+
+# The game type that notifications from contracts deployed before they carried one belong to,
+# and that backfills read when the event store is empty
+game_type = 'NEO_USD'
+sync_interval = 5 # seconds between fsyncs of the event store when events are trickling in
+starting_ts = 1519544672 # T_0 of the smart contract
+timestep = 480
+
+store = EventStore()
 
 
 # Register an event handler for Runtime.Notify events of the smart contract.
@@ -32,21 +53,99 @@ def sc_notify(event):
     if not len(event.event_payload):
         return
 
-    # The event payload list has at least one element. As developer of the smart contract
-    # you should know what data-type is in the bytes, and how to decode it. In this example,
-    # it's just a string, so we decode it with utf-8:
-    byte_array = event.event_payload[0]
-    tuple = bytes(byte_array).split(b'SEPARATOR')
-    ts = BigInteger.FromBytes(tuple[0])
-    n_correct = BigInteger.FromBytes(tuple[1])
-    prediction = BigInteger.FromBytes(tuple[2])
+    event = decode_notification(event.event_payload)
+    if event is None:
+        return
+    event_game_type, ts, n_correct, prediction = event
 
     logger.info("TS: {}".format(ts))
     logger.info("n_correct: {}".format(n_correct))
     logger.info("prediction: {}".format(prediction))
-    with open("../../webapp/CMC_Blockchain.txt","w+") as f:
-        f.write("{},{},{}".format(ts, n_correct, prediction))
+    store.append(event_game_type, ts, n_correct, prediction)
+
+
+def stack_int(item):
+    """ The integer a NEO VM byte array stands for (little-endian two's complement), read in place """
+    return int.from_bytes(memoryview(item), 'little', signed=True)
+
 
+def decode_notification(payload):
+    """ game_type, instance_ts, n_correct and prediction from a judged instance notification
+    None for any other notification
+    """
+    if len(payload) == 5:
+        # ['judged', game_type, instance_ts, n_correct, prediction]
+        if bytes(payload[0]) != b'judged':
+            return None
+        return (bytes(payload[1]).decode('utf-8'), stack_int(payload[2]),
+                stack_int(payload[3]), stack_int(payload[4]))
+    if len(payload) == 1 and b'SEPARATOR' in bytes(payload[0]):
+        # Contracts deployed before the structured notification: ts SEPARATOR n_correct SEPARATOR prediction
+        tuple = bytes(payload[0]).split(b'SEPARATOR')
+        return game_type, stack_int(tuple[0]), stack_int(tuple[1]), stack_int(tuple[2])
+    return None
+
+
+def get_storage(key):
+    item = Blockchain.Default().GetStorageItem(StorageKey(script_hash=UInt160.ParseString(smart_contract_hash), key=key))
+    if item is None:
+        return b''
+    return bytes(item.Value)
+
+
+def judged_instance(game_type, game_id, ts):
+    """ What the contract notified when it judged the instance at ts, read back from its storage
+    None if the instance isn't judged (or nobody submitted to it)
+    """
+    if game_id:
+        index = (ts - starting_ts) // timestep
+        # Instance header: count, max, correct_count (4 bytes each), judged (1 byte), bounty, remainder, prediction
+        header = get_storage(b'\x12' + game_id + index.to_bytes(4, 'little'))
+        if len(header) > 21 and header[12] == 1:
+            n_correct = int.from_bytes(header[8:12], 'little')
+            return ts, n_correct, BigInteger.FromBytes(header[21:])
+
+    # Instances judged before the compact key layout (a legacy game only gets an id once it is used again)
+    k12 = b'game_type::' + game_type.encode('utf-8') + b'game_instance::' + BigInteger(ts).ToByteArray()
+    prediction = get_storage(k12 + b'prediction::')
+    if len(prediction) == 0:
+        return None
+    n_correct = BigInteger.FromBytes(get_storage(k12 + b'correct_count::'))
+    return ts, n_correct, BigInteger.FromBytes(prediction)
+
+
+def backfill(from_height, to_height=None, game_types=None):
+    """ Records every instance of the game types whose window falls between two block heights
+    game_types defaults to every game type already in the event store
+    Notifications themselves aren't kept by the node, but every judged instance leaves
+    exactly what was notified (correct count and prediction) in the contract's storage,
+    so the history is read straight out of the local LevelDB rather than re-executing or re-syncing blocks
+    """
+    settings.setup_coznet()
+    blockchain = LevelDBBlockchain(settings.LEVELDB_PATH)
+    Blockchain.RegisterBlockchain(blockchain)
+    if to_height is None:
+        to_height = Blockchain.Default().Height
+
+    from_ts = Blockchain.Default().GetHeaderByHeight(from_height).Timestamp
+    to_ts = Blockchain.Default().GetHeaderByHeight(to_height).Timestamp
+    first_ts = starting_ts + max(0, (from_ts - starting_ts) // timestep) * timestep
+
+    if not game_types:
+        game_types = store.game_types() or [game_type]
+
+    for backfill_game_type in game_types:
+        game_id = get_storage(b'\x10' + backfill_game_type.encode('utf-8'))[:2]
+        n_recorded = 0
+        for ts in range(first_ts, to_ts + 1, timestep):
+            event = judged_instance(backfill_game_type, game_id, ts)
+            if event is not None:
+                store.append(backfill_game_type, *event)
+                n_recorded += 1
+        logger.info("Backfilled %s judged %s instances between blocks %s and %s",
+                    n_recorded, backfill_game_type, from_height, to_height)
+    # One fsync for the whole load
+    store.flush()
 
 
 def custom_background_code():
@@ -72,6 +171,10 @@ def main():
     # Disable smart contract events for external smart contracts
     settings.set_log_smart_contract_events(False)
 
+    # Batch fsyncs of the event store rather than syncing every event
+    syncloop = task.LoopingCall(store.flush)
+    syncloop.start(sync_interval)
+
     # Start a thread with custom code
     d = threading.Thread(target=custom_background_code)
     d.setDaemon(True)  # daemonizing the thread will kill it when the main thread is quit
@@ -84,4 +187,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 2 and sys.argv[1] == 'backfill':
+        args = sys.argv[3:]
+        to_height = None
+        if args and args[0].isdigit():
+            to_height = int(args.pop(0))
+        backfill(int(sys.argv[2]), to_height, args)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Tests of coinmarketcap's fetch layer against a local stub of the CMC ticker API, and of its PriceHistory ring buffer
+
+    python -m unittest test_coinmarketcap
+"""
+
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+import coinmarketcap
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before the response is written
+        pass
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Answers /{ticker}/?convert={convert} like CMC's v1 ticker, misbehaving as the test asks """
+
+    protocol_version = 'HTTP/1.1' # keep-alive, so connection reuse can be seen
+
+    def do_GET(self):
+        server = self.server
+        ticker = self.path.split('/')[1]
+        convert = self.path.split('convert=')[1]
+        with server.lock:
+            server.hits.append(ticker)
+            server.ports.add(self.client_address[1])
+            failures = server.failures.get(ticker, 0)
+            if failures:
+                server.failures[ticker] = failures - 1
+        time.sleep(server.delays.get(ticker, 0))
+        if failures or ticker in server.broken:
+            body = b'Internal Server Error'
+            self.send_response(500)
+        else:
+            body = json.dumps([{'last_updated': '1519544672', 'price_' + convert.lower(): '35.604'}]).encode('utf-8')
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = []
+        self.server.ports = set()
+        self.server.failures = {} # ticker -> requests to fail before answering
+        self.server.broken = set() # tickers that always fail
+        self.server.delays = {} # ticker -> seconds to wait before answering
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.saved = coinmarketcap.api_url, coinmarketcap.timeout, coinmarketcap.backoff
+        coinmarketcap.api_url = 'http://127.0.0.1:%s/' % self.server.server_address[1]
+        coinmarketcap.backoff = 0.01
+        coinmarketcap.session = None
+
+    def tearDown(self):
+        coinmarketcap.api_url, coinmarketcap.timeout, coinmarketcap.backoff = self.saved
+        coinmarketcap.session.close()
+        coinmarketcap.session = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_latest_price(self):
+        self.assertEqual(coinmarketcap.get_latest_price('NEO', 'USD'), ('1519544672', '35.604'))
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            coinmarketcap.get_latest_price('NEO', 'USD')
+        self.assertEqual(len(self.server.hits), 5)
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_retries_server_errors(self):
+        self.server.failures['NEO'] = coinmarketcap.retries - 1
+        self.assertEqual(coinmarketcap.get_latest_price('NEO', 'USD'), ('1519544672', '35.604'))
+        self.assertEqual(len(self.server.hits), coinmarketcap.retries)
+
+    def test_gives_up_after_retries(self):
+        self.server.broken.add('NEO')
+        with self.assertRaises(requests.HTTPError):
+            coinmarketcap.get_latest_price('NEO', 'USD')
+        self.assertEqual(len(self.server.hits), coinmarketcap.retries)
+
+    def test_timeout(self):
+        coinmarketcap.timeout = 0.1
+        self.server.delays['NEO'] = 0.5
+        started = time.time()
+        with self.assertRaises(requests.Timeout):
+            coinmarketcap.get_latest_price('NEO', 'USD')
+        # Every attempt is cut off at the timeout rather than waiting for the response
+        self.assertLess(time.time() - started, coinmarketcap.retries * 0.5)
+
+    def test_concurrent_fetches(self):
+        tickers = ['NEO', 'GAS', 'BTC', 'ETH']
+        for ticker in tickers:
+            self.server.delays[ticker] = 0.3
+        self.server.broken.add('ETH')
+        started = time.time()
+        prices = coinmarketcap.get_latest_prices([(ticker, 'USD') for ticker in tickers])
+        # Fetched one after another this would take 0.3 s per ticker plus ETH's retries,
+        # concurrently it takes about as long as ETH's retries
+        self.assertLess(time.time() - started, 0.3 * (coinmarketcap.retries + 1))
+        self.assertEqual(prices[('NEO', 'USD')], ('1519544672', '35.604'))
+        self.assertEqual(prices[('GAS', 'USD')], ('1519544672', '35.604'))
+        self.assertIsInstance(prices[('ETH', 'USD')], requests.HTTPError)
+
+    def test_update_buffer(self):
+        latest = coinmarketcap.get_latest_prices([('NEO', 'USD')])[('NEO', 'USD')]
+        buffer, changed = coinmarketcap.update_buffer(None, 10, latest=latest)
+        self.assertTrue(changed)
+        buffer, changed = coinmarketcap.update_buffer(buffer, 10, 'NEO', 'USD')
+        self.assertFalse(changed)
+        self.assertEqual(list(buffer), [(1519544672, '35.604')])
+
+
+class PriceHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = coinmarketcap.PriceHistory(3)
+
+    def test_wraps_around(self):
+        for n in range(5):
+            self.assertTrue(self.history.append(100 * (n + 1), str(n)))
+        # Only the last 3 are kept, oldest first
+        self.assertEqual(len(self.history), 3)
+        self.assertEqual(list(self.history), [(300, '2'), (400, '3'), (500, '4')])
+        self.assertEqual(self.history[0], (300, '2'))
+        self.assertEqual(self.history[-1], (500, '4'))
+        with self.assertRaises(IndexError):
+            self.history[3]
+
+    def test_ignores_older_snapshots(self):
+        self.history.append(200, 'a')
+        self.assertFalse(self.history.append(200, 'b'))
+        self.assertFalse(self.history.append(100, 'c'))
+        self.assertEqual(list(self.history), [(200, 'a')])
+
+    def test_closest_before(self):
+        self.assertIsNone(self.history.closest_before(100))
+        for n in range(5):
+            self.history.append(100 * (n + 1), str(n))
+        # Before the first snapshot still kept
+        self.assertIsNone(self.history.closest_before(299))
+        # An exact match
+        self.assertEqual(self.history.closest_before(300), (300, '2'))
+        self.assertEqual(self.history.closest_before(400), (400, '3'))
+        # Between two
+        self.assertEqual(self.history.closest_before(499), (400, '3'))
+        # After the last
+        self.assertEqual(self.history.closest_before(10 ** 10), (500, '4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests of the memory-mapped price log
+
+    python -m unittest test_price_log
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import price_log
+from price_log import MAGIC, RECORD, PriceLog
+
+
+class PriceLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'prices_NEO_USD.log')
+        self.saved = price_log.chunk_records
+        price_log.chunk_records = 4 # so appends grow the file
+
+    def tearDown(self):
+        price_log.chunk_records = self.saved
+        shutil.rmtree(self.dir)
+
+    def reopen(self, log):
+        log.close()
+        return PriceLog(self.path)
+
+    def test_append_and_replay(self):
+        log = PriceLog(self.path)
+        snapshots = [(1519544672 + 300 * n, '35.%03d' % n) for n in range(10)]
+        for last_updated, price in snapshots:
+            log.append(last_updated, price)
+        self.assertEqual(len(log), 10)
+        self.assertEqual(log.replay(), snapshots)
+        self.assertEqual(log.replay(3), snapshots[-3:])
+
+        # Replayed after a restart, and appending carries on after the last record
+        log = self.reopen(log)
+        self.assertEqual(log.replay(), snapshots)
+        log.append(1519547672, '36.0')
+        log = self.reopen(log)
+        self.assertEqual(log.replay(), snapshots + [(1519547672, '36.0')])
+        log.close()
+
+    def test_recovers_from_a_torn_record(self):
+        log = PriceLog(self.path)
+        log.append(1519544672, '35.604')
+        log.append(1519544972, '35.7')
+        log.append(1519545272, '35.8')
+        log.close()
+
+        # A crash half way through writing the last record
+        with open(self.path, 'r+b') as f:
+            f.seek(len(MAGIC) + 2 * RECORD.size + 8)
+            f.write(b'9')
+
+        log = PriceLog(self.path)
+        self.assertEqual(log.replay(), [(1519544672, '35.604'), (1519544972, '35.7')])
+        # The torn record is wiped and overwritten by the next append
+        log.append(1519545272, '35.9')
+        log = self.reopen(log)
+        self.assertEqual(log.replay(), [(1519544672, '35.604'), (1519544972, '35.7'), (1519545272, '35.9')])
+        log.close()
+
+    def test_rejects_prices_longer_than_a_record(self):
+        log = PriceLog(self.path)
+        longest = '1.' + '2' * (price_log.price_width - 2)
+        log.append(1519544672, longest)
+        with self.assertRaises(ValueError):
+            log.append(1519544972, longest + '3')
+        self.assertEqual(log.replay(), [(1519544672, longest)])
+        log.close()
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a price log')
+        with self.assertRaises(ValueError):
+            PriceLog(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
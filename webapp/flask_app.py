@@ -1,40 +1,235 @@
 
 # A very simple Flask Hello World app for you to get started with...
 
-from flask import Flask, render_template
-from coinmarketcap import Market
+from flask import Flask, abort, render_template, request
+from collections import OrderedDict
 import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'smart_contract'))
+import price_cache
+from event_store import EventStore, INTERVALS, downsample, import_legacy
+from feeds import load_feeds, scale_for
 
-coinmarketcap = Market()
 app = Flask(__name__)
+store = EventStore()
+# Carry on from the file the recorder wrote before the event store, until a backfill fills in the history
+import_legacy(store, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CMC_Blockchain.txt'))
+# Judged predictions are prices multiplied by their feed's scale, the same feeds the submitter uses
+feeds = load_feeds()
+api_cache_size = 128 # API response bodies kept in memory, keyed by their ETag
+api_cache = OrderedDict()
+
+
+def file_version(path):
+    """ Changes whenever the file is rewritten or appended to """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def human_time(ts):
+    return datetime.datetime.fromtimestamp(int(ts)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class LatestPrices(object):
+    """ The page's fields, rendered once and kept in memory
+    They are rebuilt only when the recorder appends to the event store or the price cache file is rewritten,
+    or once the cached CMC price is older than the price cache's ttl, so that it is shown as stale
+    """
+
+    def __init__(self, game_type='NEO_USD', ticker='NEO', convert='USD'):
+        self.game_type = game_type
+        self.ticker = ticker
+        self.convert = convert
+        self.version = None
+        self.built_at = 0
+        self.fields = None
+
+    def files_version(self):
+        return file_version(store.path(self.game_type)), file_version(price_cache.cache_path)
+
+    def build(self):
+        # Latest instance judged on the Blockchain, as recorded by simple_recorder.py
+        record = store.latest(self.game_type)
+        if record is None:
+            # Nothing recorded yet, e.g. a fresh deploy before the recorder has seen a judgement or a backfill has run
+            blockchain_int_ts, blockchain_n_correct, blockchain_human, blockchain_USD_Price = '', '', '', 'unavailable'
+        else:
+            blockchain_int_ts, blockchain_n_correct, blockchain_USD_Price_scaled = record
+            blockchain_human = human_time(blockchain_int_ts)
+            blockchain_USD_Price = blockchain_USD_Price_scaled / scale_for(self.game_type, feeds)
+
+        # Only read from the cache the submitter and the watcher keep up to date, page views never call CMC
+        try:
+            snapshot = price_cache.get_price(self.ticker, self.convert, refresh=False)
+            last_updated, USD_Price = snapshot
+            utc_timestamp_human = human_time(last_updated)
+            USD_Price_stale = snapshot.stale
+        except price_cache.PriceUnavailable:
+            last_updated, USD_Price, utc_timestamp_human, USD_Price_stale = '', 'unavailable', '', True
+
+        return dict(blockchain_time=blockchain_int_ts,
+                    blockchain_human=blockchain_human,
+                    blockchain_n_correct=blockchain_n_correct,
+                    blockchain_USD_Price=blockchain_USD_Price,
+                    USD_Price=USD_Price,
+                    USD_Price_stale=USD_Price_stale,
+                    utc_timestamp_human=utc_timestamp_human,
+                    last_updated=last_updated)
+
+    def get(self):
+        now = time()
+        if self.fields is None or now - self.built_at >= price_cache.ttl or self.files_version() != self.version:
+            self.fields = self.build()
+            self.version = self.files_version()
+            self.built_at = now
+        return self.fields
+
+
+latest_prices = LatestPrices()
 
 @app.route('/')
 def simple_data():
 
-    with open('webapp/CMC_Blockchain.txt') as f:
-        line = f.readline()
+    current_utc_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    blockchain_cmc_latest_arr = line.split(",")
-    blockchain_int_ts = int(blockchain_cmc_latest_arr[0])
-    blockchain_n_correct = int(blockchain_cmc_latest_arr[1])
-    blockchain_USD_Price_thousand = int(blockchain_cmc_latest_arr[2])
-    blockchain_human_utc = datetime.datetime.fromtimestamp(blockchain_int_ts).strftime('%Y-%m-%d %H:%M:%S')
-    blockchain_USD_Price = blockchain_USD_Price_thousand / 1000
+    return render_template('index.html', current_time=current_utc_time, **latest_prices.get())
 
 
-    with open('webapp/CMC_API.latest.txt') as f:
-        line = f.readline()
+# JSON API
+# Every response carries an ETag and Last-Modified derived from the files it was built from,
+# so polling clients get a 304 until the recorder appends or the price cache is refreshed, and is gzipped if the client accepts it
 
-    cmc_latest_arr = line.split(",")
-    USD_Price = cmc_latest_arr[0]
-    last_updated = cmc_latest_arr[1]
-    utc_timestamp_human = cmc_latest_arr[2]
+def api_response(versions, build):
+    """ A JSON response built by build(), unless the client or api_cache already has it """
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = hashlib.sha1(repr((request.full_path, versions, gzipped)).encode('utf-8')).hexdigest()
+    response = app.response_class(mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    mtimes = [version[0] for version in versions if isinstance(version, tuple)]
+    if mtimes:
+        response.last_modified = datetime.datetime.fromtimestamp(max(mtimes) / 1e9, datetime.timezone.utc)
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    body = api_cache.get(etag)
+    if body is None:
+        body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+        if gzipped:
+            body = gzip.compress(body)
+        api_cache[etag] = body
+        if len(api_cache) > api_cache_size:
+            api_cache.popitem(last=False)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_data(body)
+    return response
+
+
+def judged(record, scale):
+    ts, n_correct, prediction = record
+    return {'instance_ts': ts, 'human_utc': human_time(ts), 'n_correct': n_correct, 'price': prediction / scale}
+
+
+def int_arg(name, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, "%s must be a unix timestamp" % name)
+
+
+def game_type_arg():
+    game_type = request.args.get('game_type', 'NEO_USD')
+    if game_type not in store.game_types() or store.latest(game_type) is None:
+        abort(404, "No judged instances recorded for %s" % game_type)
+    return game_type
+
+
+def price_pair(game_type):
+    """ The (ticker, convert) CMC prices a game type, from its feed or else its name (e.g. NEO_USD) """
+    feed = feeds.get(game_type)
+    if feed is not None:
+        return feed['ticker'], feed['convert']
+    if '_' not in game_type:
+        abort(400, "%s isn't a feed or a TICKER_CONVERT pair" % game_type)
+    ticker, convert = game_type.split('_', 1)
+    return ticker, convert
+
+
+@app.route('/api/latest')
+def api_latest():
+    """ The latest judged instance of every game type """
+    game_types = store.game_types()
+    versions = tuple(file_version(store.path(game_type)) for game_type in game_types)
+
+    def build():
+        latest = {}
+        for game_type in game_types:
+            record = store.latest(game_type)
+            if record is not None:
+                latest[game_type] = judged(record, scale_for(game_type, feeds))
+        return latest
+
+    return api_response(versions, build)
+
+
+@app.route('/api/history')
+def api_history():
+    """ Judged instances of a game type with from <= instance_ts <= to (open ended if to isn't given)
+    Raw [instance_ts, n_correct, price] points, or with interval=hour or day, [bucket_ts, open, high, low, close, count]
+    """
+    game_type = game_type_arg()
+    from_ts = int_arg('from', 0)
+    to_ts = int_arg('to', None)
+    interval = request.args.get('interval')
+    if interval is not None and interval not in INTERVALS:
+        abort(400, "interval must be one of %s" % ', '.join(sorted(INTERVALS)))
+
+    def build():
+        scale = scale_for(game_type, feeds)
+        records = store.range(game_type, from_ts, to_ts if to_ts is not None else float('inf'))
+        if interval is None:
+            points = [[ts, n_correct, prediction / scale] for ts, n_correct, prediction in records]
+        else:
+            points = [[bucket[0]] + [price / scale for price in bucket[1:5]] + [bucket[5]]
+                      for bucket in downsample(records, INTERVALS[interval])]
+        return {'game_type': game_type, 'from': from_ts, 'to': to_ts, 'interval': interval, 'scale': scale,
+                'points': points}
+
+    return api_response((file_version(store.path(game_type)),), build)
 
-    current_utc_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    return render_template('index.html',blockchain_time = blockchain_int_ts,
-     blockchain_human = blockchain_human_utc,
-     blockchain_n_correct = blockchain_n_correct,
-     blockchain_USD_Price = blockchain_USD_Price,current_time = current_utc_time, USD_Price=USD_Price, utc_timestamp_human=utc_timestamp_human, last_updated=last_updated)
+@app.route('/api/compare')
+def api_compare():
+    """ The latest judged price of a game type next to the latest CMC price for the same pair """
+    game_type = game_type_arg()
+    ticker, convert = price_pair(game_type)
+    try:
+        snapshot = price_cache.get_price(ticker, convert, refresh=False)
+    except price_cache.PriceUnavailable as e:
+        abort(503, str(e))
+    last_updated, api_price = snapshot
+    # A cached price goes stale without the file changing, so that is part of the version too
+    versions = (file_version(store.path(game_type)), file_version(price_cache.cache_path), snapshot.stale)
 
+    def build():
+        blockchain = judged(store.latest(game_type), scale_for(game_type, feeds))
+        api = {'last_updated': last_updated, 'human_utc': human_time(last_updated), 'price': float(api_price),
+               'stale': snapshot.stale}
+        return {'game_type': game_type, 'blockchain': blockchain, 'api': api,
+                'difference': round(api['price'] - blockchain['price'], 6)}
 
+    return api_response(versions, build)
@@ -1,17 +1,18 @@
-# When run, it gets the latest price from CMC and writes it to a file for retrieval
+# When run, it refreshes the latest price from CMC in the shared price cache, which the webapp reads from
 # We do this to avoid falling foul of CMC's rate limiting when we get significant traffic
-# This is not how would we implement in practice, but since the price only updates on CMC every c. 5 minutes, it's not that important
+# The price comes through the shared price cache, so running this alongside the submitter and the webapp
+# doesn't add any requests to CMC beyond one per ticker per cache ttl
 
-from coinmarketcap import Market
 import datetime
+import os
+import sys
 
-coinmarketcap = Market()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'smart_contract'))
+import price_cache
 
 
-cmc_live = coinmarketcap.ticker("NEO",limit=0,convert="USD")[0]
-USD_Price = cmc_live['price_usd']
-last_updated = cmc_live['last_updated']
+snapshot = price_cache.get_price('NEO', 'USD')
+last_updated, USD_Price = snapshot
 utc_timestamp_human = datetime.datetime.fromtimestamp(int(last_updated)).strftime("%Y-%m-%d %H:%M:%S")
 
-with open('CMC_API.latest.txt','w+') as f:
-    f.write("{},{},{}".format(USD_Price,last_updated,utc_timestamp_human))
\ No newline at end of file
+print("{},{},{}{}".format(USD_Price, last_updated, utc_timestamp_human, " (stale)" if snapshot.stale else ""))